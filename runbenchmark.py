@@ -6,6 +6,14 @@ async def main():
     # specifying the corresponding parameters in the run_experiment function. 
     # For example, you can specify the concurrency level as 5 and the number of servers as 20 by calling the run_experiment function as follows:
     # await run_experiment("your_model_name", "general_test", concurrency=5, num_servers=20)
+    # To benchmark several models in one run, sharing the tasks and server processes, pass a list of models:
+    # await run_experiment(["your_model_name", "another_model_name"], "general_test")
+    # To spread the tasks over several worker processes (e.g. on a many-core machine), set num_workers:
+    # await run_experiment("your_model_name", "general_test", num_workers=8)
+    # To answer repeated model calls of reruns (e.g. after a scoring change) from a disk cache, set llm_cache:
+    # await run_experiment("your_model_name", "general_test", llm_cache="cache/llm.sqlite")
+    # To measure the harness alone, offline, use the oracle model, which answers every task with its expected tool calls:
+    # await run_experiment("oracle", "general_test", concurrency=30)
     await run_experiment("qwen/qwen3-32b", "general_test")
 
 if __name__ == "__main__":
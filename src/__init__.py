@@ -1,5 +1,16 @@
 from .utilities import *
+from .metrics import *
+from .limiter import *
+from .httppool import *
+from .oracle import *
+from .llmcache import *
+from .clients import *
+from .inprocess import *
+from .serverpool import *
+from .catalog import *
+from .scheduler import *
 from .agenttest import *
+from .sharded import *
 from .evaluate import *
 from .config import *
 from .experiment import *
\ No newline at end of file
@@ -1,26 +1,168 @@
 import json
 import time
 import os
+import sys
 import asyncio
+import contextvars
 from datetime import datetime
 from pathlib import Path
 import random
 from .config import ModelRegistry
-from autogen_ext.tools.mcp import StdioServerParams, mcp_server_tools
+from .serverpool import ProcessBudget, create_server_pool
+from .metrics import record_timing, start_task_metrics, timed
+from .clients import CachingChatCompletionClient, EarlyStopChatCompletionClient, LimiterFeedbackClient, RetryingChatCompletionClient, TimedChatCompletionClient
+from .limiter import AdaptiveConcurrencyLimiter
+from .llmcache import ResponseCache
+from .scheduler import estimate_makespan, estimate_task_costs, load_task_history, schedule_tasks
+from .catalog import build_tool_catalog, catalog_tools, server_key
+from autogen_ext.tools.mcp import StdioMcpToolAdapter, StdioServerParams, mcp_server_tools
 from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.messages import TextMessage
 from autogen_core import CancellationToken
 
-from .utilities import flatten, serialize_response, save_data, load_data
+from .utilities import configure_logging, flatten, serialize_response, save_data, load_data, run_bounded, JsonlWriter, save_ordered_view
 
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
-def get_servers(task_correct_tools, num_servers):
+
+# Limits for starting servers whose tools are not in the tool catalog
+SERVER_START_CONCURRENCY = 5
+SERVER_START_TIMEOUT = 30
+
+# Interval at which the total memory of the server processes is sampled during a run
+RSS_SAMPLE_INTERVAL = 1.0
+
+# Per-task counters of the model calls copied from the task metrics into every response
+TASK_COUNTERS = ("llm_retries", "llm_hedges", "llm_hedge_wins", "llm_calls_skipped",
+                 "llm_cache_hits", "llm_cache_misses", "llm_cache_saved_tokens", "llm_cache_saved_usd")
+
+
+# Options of a benchmark run and their defaults, shared by every entry point: run_experiment,
+# generate_responses_concurrent/multi/sharded and the distributed workers
+RUN_OPTION_DEFAULTS = {
+    "use_catalog": True,
+    "backend": "stdio",
+    "session_scope": "run",
+    "max_server_processes": None,
+    "prefetch_depth": 0,
+    "adaptive_concurrency": False,
+    "max_concurrency": None,
+    "rerun_errors": False,
+    "schedule": "file",
+    "llm_retries": 3,
+    "request_timeout": None,
+    "hedge": False,
+    "scoring_only": False,
+    "llm_cache": None,
+    "llm_cache_max_mb": 1024,
+    "quota_share": 1.0,
+}
+SCHEDULES = ("file", "lejf")
+SESSION_SCOPES = ("run", "agent")
+
+
+def run_options(options=None, **overrides):
+    """
+    Complete the options of a run with their defaults and check them.
+    
+    Args:
+        options: Dict of run options, possibly partial:
+            use_catalog: Build agent tools from the on-disk tool catalog instead of listing them from the servers
+            backend: How tools are executed, "stdio" (one process per server), "forkserver" (server processes forked
+                from a pre-imported launcher), "inmemory" (MCP over in-memory streams) or "inprocess" (direct function calls)
+            session_scope: "run" shares one session per server between all agents of the run,
+                "agent" gives every agent its own sessions, closed when the agent is done
+            max_server_processes: Maximum number of server processes alive at the same time across all tasks;
+                None for no limit
+            prefetch_depth: Number of queued tasks whose servers are sampled and warmed (see prepare_servers) while running tasks
+                wait on the model; 0 disables prefetching
+            adaptive_concurrency: Adjust the number of tasks in flight from the model latency and 429/5xx errors
+                (AIMD) instead of keeping it fixed at concurrency; the decisions are saved next to the log
+            max_concurrency: Upper bound of the adaptive limit, 4 * concurrency by default
+            rerun_errors: When resuming, also run again the tasks whose response in the resumed log is an error
+            schedule: Order in which tasks are submitted, "file" (task file order) or "lejf" (longest expected
+                job first, estimated from the tasks' tool counts and their times in earlier logs of logs/)
+            llm_retries: Number of times a model call failing with a retryable error (timeout, connection error,
+                408/409/429/5xx) is sent again, with jittered exponential backoff
+            request_timeout: Time after which a model call is abandoned and retried; None to wait for the task timeout
+            hedge: Send a duplicate of a model call still running after the observed p95 latency, and use
+                whichever answers first
+            scoring_only: End every agent turn once the model has issued the task's number of tool calls,
+                skipping the reflection call and any later model call; the tool calls, and so the score, are
+                the same as in a normal run, but the logged final answers are placeholders
+            llm_cache: Path of a SQLite response cache; model calls identical to a cached one (same model,
+                messages, tools and sampling parameters) are answered from it, new responses are added to it;
+                every task then samples the same servers on every run, seeded with its id
+            llm_cache_max_mb: Size bound of the response cache, least recently used responses are evicted first
+            quota_share: Share of every model's requests_per_minute/tokens_per_minute quota used by this process;
+                sharded runs give each worker process 1/num_workers of it
+        overrides: Options given as keyword arguments, taking precedence over options
+    
+    Returns:
+        dict: Every run option
+    
+    Raises:
+        ValueError: If an option, schedule or session scope is unknown
+    """
+    merged = dict(RUN_OPTION_DEFAULTS)
+    merged.update(options or {})
+    merged.update(overrides)
+    unknown = sorted(set(merged) - set(RUN_OPTION_DEFAULTS))
+    if unknown:
+        raise ValueError(f"Unknown run options: {', '.join(unknown)}")
+    if merged["schedule"] not in SCHEDULES:
+        raise ValueError(f"Unknown schedule: {merged['schedule']}")
+    if merged["session_scope"] not in SESSION_SCOPES:
+        raise ValueError(f"Unknown session scope: {merged['session_scope']}")
+    return merged
+
+
+def build_model_client(llm, options, limiter=None):
+    """
+    Wrap the client of a model with the per-call behaviour selected by the run options.
+    
+    Args:
+        llm: Model entry of a ModelRegistry
+        options: Run options, see run_options
+        limiter: Adaptive concurrency limiter fed with the latency and errors of every model call, if any
+    
+    Returns:
+        tuple: The wrapped client, and the response cache it uses (None without llm_cache), to be closed by the caller
+    """
+    # Every model call is timed into the metrics of the task that made it
+    client = TimedChatCompletionClient(llm["client"])
+    if limiter is not None:
+        client = LimiterFeedbackClient(client, limiter)
+
+    # Transient provider errors and hung requests are retried or hedged per model call, not per task
+    client = RetryingChatCompletionClient(client, max_retries=options["llm_retries"], request_timeout=options["request_timeout"], hedge=options["hedge"])
+
+    # Cache hits skip the retries, the concurrency feedback and the rate limits
+    response_cache = None
+    if options["llm_cache"]:
+        response_cache = ResponseCache(options["llm_cache"], options["llm_cache_max_mb"] * 1024 * 1024)
+        client = CachingChatCompletionClient(client, response_cache, llm["model"], llm.get("sampling_params"), llm.get("pricing"))
+        print(f"Response cache: {options['llm_cache']} ({response_cache.stats()['entries']} responses)\n")
+    return client, response_cache
+
+
+class ServerStartError(RuntimeError):
+    """A server that the task needs for its expected tools could not be started."""
+
+
+def get_servers(task_correct_tools, num_servers, seed=None):
     """
     Scan the tools directory and extract all servers required for agent construction.
     
     Args:
         task_correct_tools: List of correct tools for the task
         num_servers: Number of servers required for agent construction
+        seed: Seed of the sampling, e.g. the task id, so that a task gets the same servers in the same
+            order on every run (and its model calls can be answered from the response cache); None for
+            a different sample every time
     
     Returns:
         list: List of all servers required for agent construction
@@ -28,14 +170,14 @@ def get_servers(task_correct_tools, num_servers):
     servers_dir = Path("servers")
     servers_list = []
     task_correct_tools = [x for sublist in task_correct_tools for x in sublist]
-    task_correct_tools = list(set(task_correct_tools))
+    task_correct_tools = sorted(set(task_correct_tools))
     
     if not servers_dir.exists():
         print("Error: servers directory not found!")
         return []
     
-    # Iterate through all Python files in the tools directory
-    for file_path in servers_dir.glob("*.py"):
+    # Iterate through all Python files in the tools directory, in a fixed order for seeded sampling
+    for file_path in sorted(servers_dir.glob("*.py")):
         # Skip __init__.py
         if file_path.name == "__init__.py":
             continue
@@ -44,21 +186,92 @@ def get_servers(task_correct_tools, num_servers):
     # Correct tools for task completion are first removed 
     for tool in task_correct_tools:
         try:    
-            servers_list.remove('servers\\' + tool + '.py')
+            servers_list.remove(os.path.join('servers', tool + '.py'))
         except ValueError:
             pass
 
     # Randomly sample additional servers to get num_servers servers in total for agent construction
-    servers_list = random.sample(servers_list, num_servers - len(task_correct_tools))
+    rng = random.Random(seed) if seed is not None else random
+    servers_list = rng.sample(servers_list, num_servers - len(task_correct_tools))
     # Append correct tools back to the list
     for tool in task_correct_tools:
-        servers_list.append('servers\\' + tool + '.py')
-    random.shuffle(servers_list)
+        servers_list.append(os.path.join('servers', tool + '.py'))
+    rng.shuffle(servers_list)
     
     return servers_list
 
 
-async def construct_agent(client, task_correct_tools, num_servers, num_tools):
+async def load_server_tools(servers_list, server_pool=None, max_parallel=SERVER_START_CONCURRENCY, timeout_seconds=SERVER_START_TIMEOUT, failed_servers=None):
+    """
+    Start servers and list their tools concurrently.
+    A server that fails or exceeds the timeout is reported and left out, the other servers are not affected.
+    
+    Args:
+        servers_list: List of server files
+        server_pool: Shared ServerPool; if None, a temporary server process is started for every server
+        max_parallel: Maximum number of servers started at the same time
+        timeout_seconds: Timeout for starting a single server and listing its tools; a server pool applies
+            its own start timeout once the server has a process slot, so waiting for the slot does not count
+        failed_servers: Dict to add the error of every server that failed or timed out to, keyed by server file
+    
+    Returns:
+        dict: Tools of every server that started successfully, keyed by server file
+    """
+    async def load(server):
+        if server_pool is not None:
+            return await server_pool.tools(server)
+        return await mcp_server_tools(StdioServerParams(command="python", args=[server]))
+
+    results = await run_bounded(servers_list, load, max_parallel, timeout_seconds if server_pool is None else None)
+
+    server_tools = {}
+    for server, result in zip(servers_list, results):
+        if isinstance(result, BaseException):
+            print(f"Warning: Failed to load tools from {server}: {type(result).__name__}: {result}")
+            if failed_servers is not None:
+                failed_servers[server] = f"{type(result).__name__}: {result}"
+            continue
+        server_tools[server] = result
+    return server_tools
+
+
+async def prepare_servers(task_correct_tools, num_servers, server_pool=None, tool_catalog=None, seed=None):
+    """
+    Sample the servers of a task ahead of time and warm the ones the task is going to need.
+    Without a tool catalog, construct_agent starts every sampled server to list its tools, so all of them
+    are warmed. With a catalog, tools are bound without starting their server, so only the servers of the
+    task's expected tools and the sampled servers missing from the catalog are started.
+    
+    Args:
+        task_correct_tools: List of correct tools for the task
+        num_servers: Number of servers required for agent construction
+        server_pool: Shared ServerPool to warm; if None, the servers are only sampled
+        tool_catalog: Tool catalog the agent's tools will be built from, if any
+        seed: Seed of the server sampling, see get_servers
+    
+    Returns:
+        list: The sampled servers, to be passed to construct_agent
+    """
+    servers_list = get_servers(task_correct_tools, num_servers, seed)
+    if server_pool is None:
+        return servers_list
+    if tool_catalog is None:
+        await load_server_tools(servers_list, server_pool)
+        return servers_list
+
+    expected = {os.path.join('servers', tool + '.py') for tool in flatten(task_correct_tools)}
+    uncataloged = [server for server in servers_list if server_key(server) not in tool_catalog]
+    to_warm = [server for server in servers_list if server in expected and server not in uncataloged]
+    await load_server_tools(uncataloged, server_pool)
+    # The pool times the start of every server out itself, from the moment it gets a process slot
+    results = await run_bounded(to_warm, server_pool.warm, SERVER_START_CONCURRENCY, None)
+    for server, result in zip(to_warm, results):
+        if isinstance(result, BaseException):
+            print(f"Warning: Failed to start {server} ahead of time: {type(result).__name__}: {result}")
+    return servers_list
+
+
+async def construct_agent(client, task_correct_tools, num_servers, num_tools, server_pool=None, tool_catalog=None, servers_list=None, scoring_only=False, seed=None, failed_servers=None):
     """
     Construct an agent for a single task.
     
@@ -67,21 +280,61 @@ async def construct_agent(client, task_correct_tools, num_servers, num_tools):
         task_correct_tools: List of correct tools for the task
         num_servers: Number of servers required for agent construction
         num_tools: Number of tools required for task completion
+        server_pool: Shared ServerPool; if None, a fresh server process is started for every server
+        tool_catalog: Tool catalog; if given, tools are built from it, and of the servers in it only those of
+            the expected tools are started, to check that they are up
+        servers_list: Servers sampled in advance by prepare_servers; if None, servers are sampled here
+        scoring_only: End the agent turn once the model has issued num_tools tool calls, without the
+            reflection call or any further model call, since only the tool calls are scored
+        seed: Seed of the server sampling, see get_servers
+        failed_servers: Dict to add the error of every sampled server that failed to start to, keyed by server file
     
     Returns:
         AssistantAgent: The constructed agent
+
+    Raises:
+        ServerStartError: A server of the task's expected tools failed to start
     """
 
-    servers_list = get_servers(task_correct_tools, num_servers)
+    if servers_list is None:
+        servers_list = get_servers(task_correct_tools, num_servers, seed)
 
-    tools = []
+    # Tools of servers found in the catalog are bound without starting the server,
+    # the remaining servers are started concurrently to list their tools
+    expected = {os.path.join('servers', tool + '.py') for tool in flatten(task_correct_tools)}
+    server_tools = {}
+    servers_to_start = []
+    servers_to_warm = []
     for server in servers_list:
-        server = StdioServerParams(
-            command="python",
-            args=[server],
-        )
-        tools += await mcp_server_tools(server)
+        if tool_catalog is None or server_key(server) not in tool_catalog:
+            servers_to_start.append(server)
+            continue
+        catalog_entries = catalog_tools(tool_catalog, server)
+        if server_pool is not None:
+            server_tools[server] = server_pool.bind_tools(server, catalog_entries)
+            if server in expected:
+                servers_to_warm.append(server)
+        else:
+            server_params = StdioServerParams(command="python", args=[server])
+            server_tools[server] = [StdioMcpToolAdapter(server_params=server_params, tool=tool) for tool in catalog_entries]
+    if failed_servers is None:
+        failed_servers = {}
+    server_tools.update(await load_server_tools(servers_to_start, server_pool, failed_servers=failed_servers))
+    # Already running if they were prefetched; the pool times their start out itself
+    results = await run_bounded(servers_to_warm, server_pool.warm, SERVER_START_CONCURRENCY, None) if servers_to_warm else []
+    for server, result in zip(servers_to_warm, results):
+        if isinstance(result, BaseException):
+            print(f"Warning: Failed to start {server}: {type(result).__name__}: {result}")
+            failed_servers[server] = f"{type(result).__name__}: {result}"
+
+    # Without an expected server the task cannot be solved, which says nothing about the model
+    missing = sorted(server for server in failed_servers if server in expected)
+    if missing:
+        raise ServerStartError(f"Expected servers failed to start: {', '.join(missing)}")
+
+    tools = [tool for server in servers_list for tool in server_tools.get(server, [])]
 
+    prompt_start = time.perf_counter()
     tool_definitions = []
     if tools:
             for tool_func in tools:
@@ -123,19 +376,23 @@ Your task: Act according to the user's request, following a fixed thinking proce
 Now, please begin working based on the user's request. Be sure to include the `Thought:` section in your very first reply.
 """
 
+    if scoring_only:
+        client = EarlyStopChatCompletionClient(client, num_tools)
+
     assistant = AssistantAgent(
         name="assistant",
         model_client=client,
         tools=tools,
         system_message=system_message,
-        reflect_on_tool_use=True,
+        reflect_on_tool_use=not scoring_only,
         max_tool_iterations=num_tools,
     )
+    record_timing("prompt_build", time.perf_counter() - prompt_start)
 
     return assistant
 
 
-async def process_single_task(client, task, num_servers, task_index, total_tasks):
+async def process_single_task(client, task, num_servers, task_index, total_tasks, server_pool=None, tool_catalog=None, backend="stdio", process_budget=None, prepared_servers=None, scoring_only=False, task_metrics=None, seed_servers=False):
     """
     Process a single task with its dedicated agent.
     
@@ -145,9 +402,19 @@ async def process_single_task(client, task, num_servers, task_index, total_tasks
         num_servers: Number of servers required for agent construction
         task_index: Index of current task
         total_tasks: Total number of tasks
+        server_pool: Shared ServerPool used to get the tools of the sampled servers; if None, the task
+            opens its own server sessions and closes them once the agent has been reset
+        tool_catalog: Tool catalog used to build the tools without listing them from the servers
+        backend: Backend of the task's own server pool, used when server_pool is None
+        process_budget: Process budget of the task's own server pool
+        prepared_servers: Awaitable returning the servers sampled in advance for this task, or None
+        scoring_only: Skip the model calls made after the required tool calls, see construct_agent
+        task_metrics: Metrics already collected for this task while its servers were prefetched, or None
+        seed_servers: Sample the task's servers with its id as seed, so that every run gives it the same
+            servers and its model calls can be answered from the response cache
     
     Returns:
-        dict: Response data for the task
+        dict: Response data for the task, with the servers that failed to start in failed_servers
     """
     task_id = task["id"]
     task_content = task["content"]
@@ -158,13 +425,26 @@ async def process_single_task(client, task, num_servers, task_index, total_tasks
     print(f"\n--- Processing Task {task_index + 1}/{total_tasks} (ID: {task_id}) ---")
     print(f"Task content: {task_content}")
     task_start_time = time.time()
+    task_metrics = start_task_metrics(task_metrics)
 
     assistant = None
+    failed_servers = {}
     timeout_seconds = 360  # 6 minutes timeout
+
+    # Without a shared pool, all tools of a server share one session for the lifetime of this agent
+    task_pool = None
+    if server_pool is None:
+        task_pool = server_pool = create_server_pool(backend, process_budget)
     
     try:
-        # Construct agent for this specific task
-        assistant = await construct_agent(client, task_correct_tools, num_servers, num_tools)
+        # Construct agent for this specific task, with the servers prefetched for it if any
+        servers_list = None
+        if prepared_servers is not None:
+            try:
+                servers_list = await prepared_servers
+            except Exception as e:
+                print(f"Warning: Prefetching servers for task {task_id} failed: {e}")
+        assistant = await construct_agent(client, task_correct_tools, num_servers, num_tools, server_pool, tool_catalog, servers_list, scoring_only, seed=task_id if seed_servers else None, failed_servers=failed_servers)
         
         try:
             response = await asyncio.wait_for(
@@ -186,10 +466,16 @@ async def process_single_task(client, task, num_servers, task_index, total_tasks
         
         print(f"✓ Task {task_index + 1} (ID: {task_id}) completed")
 
-        await assistant.on_reset(CancellationToken())
+        with timed("reset"):
+            await assistant.on_reset(CancellationToken())
         task_end_time = time.time()
         task_time = task_end_time - task_start_time
         response_data["task_time"] = task_time
+        response_data["failed_servers"] = failed_servers
+        response_data["spawn_wait_time"] = task_metrics.get("spawn_wait_time", 0)
+        response_data["timings"] = task_metrics.get("timings", {})
+        for counter in TASK_COUNTERS:
+            response_data[counter] = task_metrics.get(counter, 0)
         return response_data
         
     # General exception handler for all error types
@@ -229,6 +515,11 @@ async def process_single_task(client, task, num_servers, task_index, total_tasks
                 "message": e.msg
             }
         
+        elif isinstance(e, ServerStartError):
+            print(f"  Cause: Infrastructure error, not a model failure")
+            error_response["likely_cause"] = "Infrastructure error - an expected server failed to start"
+            error_response["infrastructure_error"] = True
+        
         elif isinstance(e, TypeError):
             if "JSON object must be str" in error_msg or "NoneType" in error_msg:
                 print(f"  Likely Cause: LLM returned None for tool call arguments instead of JSON string")
@@ -238,7 +529,8 @@ async def process_single_task(client, task, num_servers, task_index, total_tasks
         # Reset assistant if it was created
         if assistant is not None:
             try:
-                await assistant.on_reset(CancellationToken())
+                with timed("reset"):
+                    await assistant.on_reset(CancellationToken())
             except:
                 pass  # Ignore reset errors
         
@@ -246,69 +538,307 @@ async def process_single_task(client, task, num_servers, task_index, total_tasks
         task_end_time = time.time()
         task_time = task_end_time - task_start_time
         error_response["task_time"] = task_time
+        error_response["failed_servers"] = failed_servers
+        error_response["spawn_wait_time"] = task_metrics.get("spawn_wait_time", 0)
+        error_response["timings"] = task_metrics.get("timings", {})
+        for counter in TASK_COUNTERS:
+            error_response[counter] = task_metrics.get(counter, 0)
         
         return error_response
 
+    finally:
+        # Sessions owned by this task are closed after the agent has been reset
+        if task_pool is not None:
+            await task_pool.close()
+
+
+def load_completed_responses(log_path, tasks, rerun_errors=False):
+    """
+    Load the responses of a previous (possibly interrupted) run that can be reused for the given tasks.
+    
+    Args:
+        log_path: Response log of the previous run, .json or .jsonl
+        tasks: Tasks of the current run
+        rerun_errors: Leave out error responses, so that their tasks are run again
+    
+    Returns:
+        dict: Reusable responses keyed by task id, in task order, with task_index set for the current tasks
+    """
+    task_indexes = {task["id"]: index for index, task in enumerate(tasks)}
+    found = {}
+    for response in load_data(log_path):
+        task_id = response.get("task_id")
+        if task_id not in task_indexes:
+            continue
+        if "error" in response and (rerun_errors or task_id in found):
+            continue
+        # A later answer of the same task replaces an earlier one, unless it is an error
+        found[task_id] = response
+
+    completed = {}
+    for task_id in sorted(found, key=task_indexes.get):
+        response = found[task_id]
+        response["task_index"] = task_indexes[task_id] + 1
+        completed[task_id] = response
+    return completed
+
+
+def task_summary(response):
+    """The fields of a successful response kept in memory for the run summary once it is in the log."""
+    return {key: response.get(key, 0) for key in ("task_id", "spawn_wait_time") + TASK_COUNTERS}
+
 
-async def generate_responses_concurrent(model, tasks_path, output_path, concurrency, num_servers):
+def peak_rss_mb():
+    """
+    Peak resident set size of the harness process, in MB.
+    Returns None on platforms without the resource module.
+    """
+    if resource is None:
+        return None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def server_rss_mb():
+    """
+    Current resident set size of all live descendant processes of the harness (the server processes,
+    and the launcher of the forkserver backend), summed, in MB.
+    Pages shared by forked processes are counted once per process.
+    Returns None on platforms without /proc.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    children = {}
+    rss_pages = {}
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "r") as f:
+                # Fields after the parenthesized command name: state, ppid, ..., rss (in pages) is the 22nd
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue  # The process exited while scanning
+        pid = int(entry.name)
+        children.setdefault(int(fields[1]), []).append(pid)
+        rss_pages[pid] = int(fields[21])
+
+    total = 0
+    stack = list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        total += rss_pages.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+async def track_server_rss(peak, interval=RSS_SAMPLE_INTERVAL):
+    """Sample server_rss_mb every interval seconds into peak["server_rss_mb"], the highest sum seen, until cancelled."""
+    while True:
+        rss = server_rss_mb()
+        if rss is None:
+            return
+        peak["server_rss_mb"] = max(peak.get("server_rss_mb", 0.0), rss)
+        await asyncio.sleep(interval)
+
+
+async def generate_responses_concurrent(model, tasks_path, output_path, concurrency, num_servers, options=None, resume_from=None,
+                                       tasks=None, model_registry=None, tool_catalog=None, server_pool=None, process_budget=None, **overrides):
     """
     Process all tasks with dedicated agents, running multiple tasks concurrently.
     Each task gets its own agent. Tasks are processed in batches based on concurrency.
+    The last five arguments let several runs share their tasks and infrastructure, see generate_responses_multi.
     
     Args:
         model: Model name to use
         tasks_path: Path to tasks JSON file
-        output_path: Output path for saving all responses
-        concurrency: Number of tasks to process simultaneously
+        output_path: Output path for saving all responses; they are streamed to a .jsonl file next to it
+            while the tasks run, and written to output_path ordered by task at the end
+        concurrency: Number of tasks to process simultaneously; the initial limit with adaptive_concurrency
         num_servers: Number of servers required for agent construction
+        options: Run options, see run_options
+        resume_from: Log (.json or .jsonl) of an interrupted run of the same tasks; its answered tasks are
+            copied into this run's log and only the missing tasks are run
+        tasks: Tasks already loaded from tasks_path
+        model_registry: ModelRegistry to get the model client from, not closed by this run
+        tool_catalog: Tool catalog already built; use_catalog is ignored when given
+        server_pool: Server pool shared with other runs, not closed by this run (session_scope "run" only)
+        process_budget: Process budget shared with other runs; max_server_processes is ignored when given
+        overrides: Run options given as keyword arguments, e.g. backend="inmemory"
     
     Returns:
         str: Output file path
     """
+    options = run_options(options, **overrides)
+    configure_logging()
+    backend = options["backend"]
+    session_scope = options["session_scope"]
+    schedule = options["schedule"]
+    prefetch_depth = options["prefetch_depth"]
+    adaptive_concurrency = options["adaptive_concurrency"]
+    scoring_only = options["scoring_only"]
+
     print(f"\n{'='*80}")
     print(f"Starting concurrent task processing")
-    print(f"Concurrency level: {concurrency} tasks at a time")
+    if adaptive_concurrency:
+        print(f"Concurrency level: adaptive, starting at {concurrency} tasks at a time")
+    else:
+        print(f"Concurrency level: {concurrency} tasks at a time")
+    print(f"Server backend: {backend} (sessions per {session_scope})")
+    if prefetch_depth:
+        print(f"Prefetching servers of the next {prefetch_depth} queued tasks")
     print(f"{'='*80}\n")
     
     overall_start_time = time.time()
     
     # Load model and tasks
-    llm = ModelRegistry("configs/config.json").get(model)
-    client = llm["client"]
+    # Only the client of this model is created; a registry created here is closed at the end of the run
+    owns_model_registry = model_registry is None
+    if owns_model_registry:
+        # Failed calls are retried by build_model_client, not by the SDK underneath
+        model_registry = ModelRegistry("configs/config.json", sdk_retries=0, quota_share=options["quota_share"])
+    if tasks is None:
+        tasks = load_data(tasks_path)
+    total_tasks = len(tasks)
+    # The oracle answers the tasks of this run, whatever their task file
+    llm = model_registry.get(model, tasks=tasks)
     print(f"Model: {llm['name']}\n")
     
-    tasks = load_data(tasks_path)
-    total_tasks = len(tasks)
     print(f"Total tasks to process: {total_tasks}\n")
+
+    # Tasks already answered in the log being resumed are copied over instead of being run again
+    completed = load_completed_responses(resume_from, tasks, options["rerun_errors"]) if resume_from else {}
+    pending = [(index, task) for index, task in enumerate(tasks) if task["id"] not in completed]
+    if resume_from:
+        print(f"Resuming from {resume_from}: {len(completed)} tasks already answered, {len(pending)} to run\n")
+
+    # Expected task durations, used to order the submissions and to estimate the makespan.
+    # Reading the earlier logs can take a while, so the file schedule estimates from the task shapes alone
+    history = load_task_history(model=model) if schedule == "lejf" else {}
+    costs = estimate_task_costs([task for _, task in pending], history)
+    file_order_makespan = estimate_makespan(costs, concurrency)
+    if schedule == "lejf":
+        order = schedule_tasks([task for _, task in pending], costs)
+        pending = [pending[position] for position in order]
+        costs = [costs[position] for position in order]
+    estimated_makespan = estimate_makespan(costs, concurrency)
+    # Without the time of any of these tasks in earlier logs, the costs are tool counts, not seconds
+    costs_in_seconds = any(task["id"] in history for _, task in pending)
+    unit = "seconds" if costs_in_seconds else "cost units (tool calls + steps)"
+    print(f"Schedule: {schedule}, estimated makespan {estimated_makespan:.2f} {unit} (file order: {file_order_makespan:.2f})\n")
     
     # Process tasks in batches with concurrency control
     all_responses = []
+
+    # Every response is appended to the JSONL log as soon as its task finishes
+    jsonl_path = os.path.splitext(output_path)[0] + ".jsonl"
+    print(f"Streaming responses to: {jsonl_path}\n")
     
-    # Use semaphore to control concurrency
-    semaphore = asyncio.Semaphore(concurrency)
+    # Use semaphore to control concurrency, or a limiter adjusted by the feedback of every model call
+    if adaptive_concurrency:
+        semaphore = AdaptiveConcurrencyLimiter(concurrency, max_limit=options["max_concurrency"])
+    else:
+        semaphore = asyncio.Semaphore(concurrency)
+    client, response_cache = build_model_client(llm, options, semaphore if adaptive_concurrency else None)
+
+    # Tool definitions are read from the catalog, stale entries are rebuilt first
+    if tool_catalog is None and options["use_catalog"]:
+        tool_catalog = await build_tool_catalog()
+
+    # Server processes of all tasks share one budget, independent of the task concurrency
+    if process_budget is None:
+        process_budget = ProcessBudget(options["max_server_processes"])
+
+    # Servers are started once and shared by all agents of this run
+    owns_server_pool = False
+    if session_scope == "run":
+        if server_pool is None:
+            server_pool = create_server_pool(backend, process_budget)
+            owns_server_pool = True
+    else:
+        server_pool = None
     
-    async def process_with_semaphore(task, index):
+    # With the response cache, a task samples the same servers on every run so that its prompts repeat;
+    # otherwise the servers are sampled at random as before
+    seed_servers = bool(options["llm_cache"])
+
+    # Servers of the next queued tasks are prepared in the background, keyed by queue position.
+    # Each prefetch runs in the metrics context of the task it prepares, so its server starts count for that task
+    prefetched = {}
+    prefetched_metrics = {}
+    started_tasks = 0
+
+    def prefetch(position):
+        if position < len(pending) and position not in prefetched:
+            context = contextvars.copy_context()
+            prefetched_metrics[position] = context.run(start_task_metrics)
+            prefetched[position] = asyncio.create_task(
+                prepare_servers(pending[position][1]["tools"], num_servers, server_pool, tool_catalog,
+                                seed=pending[position][1]["id"] if seed_servers else None),
+                context=context,
+            )
+
+    async def process_with_semaphore(task, index, position):
+        nonlocal started_tasks
         async with semaphore:
-            return await process_single_task(
+            # Tasks get the semaphore in submission order, so the next queued tasks follow the started ones
+            started_tasks += 1
+            for next_index in range(started_tasks, started_tasks + prefetch_depth):
+                prefetch(next_index)
+            response = await process_single_task(
                 client=client,
                 task=task,
                 num_servers=num_servers,
                 task_index=index,
-                total_tasks=total_tasks
+                total_tasks=total_tasks,
+                server_pool=server_pool,
+                tool_catalog=tool_catalog,
+                backend=backend,
+                process_budget=process_budget,
+                prepared_servers=prefetched.pop(position, None),
+                scoring_only=scoring_only,
+                task_metrics=prefetched_metrics.pop(position, None),
+                seed_servers=seed_servers,
             )
+
+        # The response is on disk once written; only what the summary needs is kept in memory
+        await log_writer.write(response)
+        if "error" in response:
+            return response
+        return task_summary(response)
     
     # Create all task coroutines
-    print(f"Creating {total_tasks} task coroutines with concurrency limit of {concurrency}...\n")
+    print(f"Creating {len(pending)} task coroutines with concurrency limit of {concurrency}...\n")
     
     # Process all tasks with controlled concurrency
     task_coroutines = [
-        process_with_semaphore(task, i) 
-        for i, task in enumerate(tasks)
+        process_with_semaphore(task, i, position)
+        for position, (i, task) in enumerate(pending)
     ]
     
     # Execute all tasks concurrently (but limited by semaphore)
     print(f"Starting batch processing...\n")
-    all_responses = await asyncio.gather(*task_coroutines)
+    peak_memory = {}
+    rss_tracker = asyncio.create_task(track_server_rss(peak_memory))
+    try:
+        async with JsonlWriter(jsonl_path) as log_writer:
+            for response in completed.values():
+                await log_writer.write(response)
+            all_responses = [r if "error" in r else task_summary(r) for r in completed.values()]
+            completed.clear()
+            all_responses += await asyncio.gather(*task_coroutines)
+    finally:
+        rss_tracker.cancel()
+        for prefetch_task in prefetched.values():
+            prefetch_task.cancel()
+        await asyncio.gather(*prefetched.values(), return_exceptions=True)
+        if owns_server_pool:
+            await server_pool.close()
+        if owns_model_registry:
+            await model_registry.close()
+        if response_cache is not None:
+            cache_stats = response_cache.stats()
+            response_cache.close()
     
     overall_end_time = time.time()
     total_time = overall_end_time - overall_start_time
@@ -318,20 +848,114 @@ async def generate_responses_concurrent(model, tasks_path, output_path, concurre
     failed_tasks = total_tasks - successful_tasks
     failed_tasks_list = [r for r in all_responses if "error" in r]
     
-    # Save all responses to JSON file
-    save_data(output_path, all_responses)
+    # Save all responses, ordered by task, to the JSON file
+    save_ordered_view(jsonl_path, output_path)
     
     print(f"\n{'='*80}")
     print(f"Concurrent execution completed!")
     print(f"{'='*80}")
     print(f"Total execution time: {total_time:.2f} seconds")
+    if costs_in_seconds:
+        print(f"Makespan: {total_time:.2f} seconds actual, {estimated_makespan:.2f} estimated for the {schedule} schedule "
+              f"({file_order_makespan:.2f} estimated for file order)")
     print(f"Total tasks: {total_tasks}")
     print(f"Successfully generated responses: {successful_tasks}")
     print(f"Error when generating responses: {failed_tasks}")
     print(f"Error list: {failed_tasks_list}")
-    print(f"Concurrency level: {concurrency}")
+    if adaptive_concurrency:
+        decisions_path = os.path.splitext(output_path)[0] + "_concurrency.json"
+        save_data(decisions_path, {
+            "initial_limit": concurrency,
+            "max_limit": semaphore.max_limit,
+            "final_limit": semaphore.limit,
+            "peak_in_flight": semaphore.peak_in_flight,
+            "decisions": semaphore.decisions,
+        })
+        print(f"Concurrency level: adaptive, {concurrency} -> {semaphore.limit} "
+              f"(peak {semaphore.peak_in_flight} in flight, {len(semaphore.decisions)} decisions saved to {decisions_path})")
+    else:
+        print(f"Concurrency level: {concurrency}")
+    print(f"Server processes: {process_budget.spawns} started, peak {process_budget.peak_live} alive at once, "
+          f"{process_budget.live} alive at the end (limit: {options['max_server_processes'] or 'none'})")
+    print(f"Spawn queue wait: {process_budget.total_wait:.2f} seconds in total, "
+          f"max {max((r.get('spawn_wait_time', 0) for r in all_responses), default=0):.2f} seconds per task")
+    print(f"Model calls: {sum(r.get('llm_retries', 0) for r in all_responses)} retries, "
+          f"{sum(r.get('llm_hedges', 0) for r in all_responses)} hedged "
+          f"({sum(r.get('llm_hedge_wins', 0) for r in all_responses)} answered first by the duplicate)")
+    if response_cache is not None:
+        print(f"Response cache: {sum(r.get('llm_cache_hits', 0) for r in all_responses)} hits, "
+              f"{sum(r.get('llm_cache_misses', 0) for r in all_responses)} misses, "
+              f"${sum(r.get('llm_cache_saved_usd', 0) for r in all_responses):.4f} saved; "
+              f"{cache_stats['entries']} responses, {cache_stats['bytes'] / 2**20:.1f} MB, {cache_stats['evictions']} evicted")
+    if scoring_only:
+        print(f"Scoring-only: {sum(r.get('llm_calls_skipped', 0) for r in all_responses)} model calls skipped after the required tool calls")
+    connection_stats = model_registry.connection_stats().get(llm.get("base_url"))
+    if connection_stats:
+        print(f"HTTP connections to {llm['base_url']}: {connection_stats['requests']} requests on "
+              f"{connection_stats['connections']} connections ({connection_stats['tls_handshakes']} TLS handshakes, "
+              f"{connection_stats['reuse_rate']:.1%} of requests on a reused connection)")
+    harness_rss = peak_rss_mb()
+    if harness_rss is not None:
+        memory = f"Peak RSS: harness {harness_rss:.1f} MB"
+        if "server_rss_mb" in peak_memory:
+            memory += f", server processes {peak_memory['server_rss_mb']:.1f} MB in total (sampled every {RSS_SAMPLE_INTERVAL:g} s)"
+        print(memory)
     print(f"\nAll response data saved to: {output_path}")
     print(f"File size: {os.path.getsize(output_path)} bytes")
     print(f"{'='*80}\n")
     
     return output_path
+
+
+async def generate_responses_multi(models, tasks_path, output_paths, concurrency, num_servers, options=None, resume_from=None, **overrides):
+    """
+    Process all tasks with several models at the same time.
+    The tasks, model registry, tool catalog, process budget and (with session_scope "run") the server pool
+    are created once and shared by all models. Every model has its own concurrency limit, so a slow
+    provider does not hold back the others, and a model that fails does not stop the other runs.
+    
+    Args:
+        models: Model names to use
+        tasks_path: Path to tasks JSON file
+        output_paths: Output path for saving the responses of each model, keyed by model
+        options: Run options, see run_options; concurrency applies to each model
+        resume_from: Log of an interrupted run to resume, keyed by model; models without one start from scratch
+        Other arguments: See generate_responses_concurrent
+    
+    Returns:
+        dict: Output file path of every model whose run completed
+    """
+    options = run_options(options, **overrides)
+    configure_logging()
+    tasks = load_data(tasks_path)
+    model_registry = ModelRegistry("configs/config.json", sdk_retries=0, quota_share=options["quota_share"])
+    tool_catalog = await build_tool_catalog() if options["use_catalog"] else None
+    process_budget = ProcessBudget(options["max_server_processes"])
+    server_pool = create_server_pool(options["backend"], process_budget) if options["session_scope"] == "run" else None
+
+    try:
+        results = await asyncio.gather(*(
+            generate_responses_concurrent(
+                model, tasks_path, output_paths[model], concurrency, num_servers,
+                options=options,
+                resume_from=(resume_from or {}).get(model),
+                tasks=tasks,
+                model_registry=model_registry,
+                tool_catalog=tool_catalog,
+                server_pool=server_pool,
+                process_budget=process_budget,
+            )
+            for model in models
+        ), return_exceptions=True)
+    finally:
+        if server_pool is not None:
+            await server_pool.close()
+        await model_registry.close()
+
+    completed = {}
+    for model, result in zip(models, results):
+        if isinstance(result, BaseException):
+            print(f"✗ Run of model {model} failed: {type(result).__name__}: {result}")
+            continue
+        completed[model] = result
+    return completed
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+from autogen_ext.tools.mcp import StdioServerParams, create_mcp_server_session
+from mcp import Tool
+
+from .utilities import load_data, save_data, run_bounded
+
+
+CATALOG_PATH = "cache/tool_catalog.json"
+INTROSPECT_CONCURRENCY = 8
+INTROSPECT_TIMEOUT = 60
+
+
+def server_key(server_path: str) -> str:
+    """Catalog key of a server file, i.e. its file name without extension."""
+    return Path(server_path).stem
+
+
+def file_hash(file_path: str) -> str:
+    """Content hash of a server file, used to detect stale catalog entries."""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+async def introspect_server(server_path: str) -> List[Dict[str, Any]]:
+    """
+    Start a server once and read the name, description and input schema of its tools.
+
+    Args:
+        server_path: Path to the server file
+
+    Returns:
+        list: Tool definitions as returned by the MCP list_tools request
+    """
+    # Several servers may be starting at the same time, so allow more than the default 5 s to initialize
+    server_params = StdioServerParams(command="python", args=[server_path], read_timeout_seconds=INTROSPECT_TIMEOUT)
+    async with create_mcp_server_session(server_params) as session:
+        await session.initialize()
+        result = await session.list_tools()
+    return [tool.model_dump(mode="json", exclude_none=True) for tool in result.tools]
+
+
+async def build_tool_catalog(servers_dir: str = "servers", catalog_path: str = CATALOG_PATH) -> Dict[str, Any]:
+    """
+    Build or refresh the on-disk tool catalog.
+    Only servers that are new or whose file hash changed since the last build are started, concurrently.
+
+    Args:
+        servers_dir: Directory containing the server files
+        catalog_path: Path of the catalog file
+
+    Returns:
+        dict: Catalog mapping server key to {"path", "hash", "tools"}
+    """
+    catalog = load_data(catalog_path) if os.path.exists(catalog_path) else {}
+    changed = False
+
+    server_paths = sorted(str(p) for p in Path(servers_dir).glob("*.py") if p.name != "__init__.py")
+    keys = {server_key(p) for p in server_paths}
+    for key in [k for k in catalog if k not in keys]:
+        del catalog[key]
+        changed = True
+
+    stale = []
+    for server_path in server_paths:
+        digest = file_hash(server_path)
+        entry = catalog.get(server_key(server_path))
+        if entry is None or entry.get("hash") != digest:
+            stale.append((server_path, digest))
+
+    if stale:
+        print(f"Introspecting tools of {len(stale)} servers")
+        results = await run_bounded([p for p, _ in stale], introspect_server, INTROSPECT_CONCURRENCY, INTROSPECT_TIMEOUT)
+        kept_stale = []
+        for (server_path, digest), result in zip(stale, results):
+            key = server_key(server_path)
+            if isinstance(result, BaseException):
+                # Keep any previous entry; its old hash makes the next build try again
+                print(f"Warning: Failed to introspect {server_path}: {type(result).__name__}: {result}")
+                if key in catalog:
+                    kept_stale.append(key)
+            else:
+                catalog[key] = {"path": server_path, "hash": digest, "tools": result}
+        if kept_stale:
+            print(f"Warning: Using stale catalog entries for {len(kept_stale)} servers whose source changed: {', '.join(kept_stale)}")
+        changed = True
+
+    if changed:
+        os.makedirs(os.path.dirname(catalog_path) or ".", exist_ok=True)
+        save_data(catalog_path, catalog)
+
+    return catalog
+
+
+def catalog_tools(catalog: Dict[str, Any], server_path: str) -> List[Tool]:
+    """
+    Get the MCP tool definitions of a server from the catalog.
+
+    Args:
+        catalog: Catalog returned by build_tool_catalog
+        server_path: Path to the server file
+
+    Returns:
+        list: MCP tool definitions of the server
+
+    Raises:
+        KeyError: If the server is not in the catalog
+    """
+    return [Tool.model_validate(tool) for tool in catalog[server_key(server_path)]["tools"]]
+
+
+if __name__ == "__main__":
+    asyncio.run(build_tool_catalog())
@@ -0,0 +1,508 @@
+import asyncio
+import contextvars
+import random
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Dict, Literal, Mapping, Optional, Sequence, Union
+
+import openai
+from autogen_core import CancellationToken, FunctionCall
+from autogen_core.models import AssistantMessage, ChatCompletionClient, CreateResult, LLMMessage, ModelCapabilities, ModelInfo, RequestUsage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from .limiter import AdaptiveConcurrencyLimiter, TokenBucket, is_throttle_error
+from .llmcache import ResponseCache, request_key
+from .metrics import add_metric, percentile, record_timing, timed
+
+
+# HTTP status codes of model calls that are retried, besides 5xx
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+# Number of recent call latencies the hedging threshold is computed from
+HEDGE_LATENCY_WINDOW = 200
+
+# Time the model call running in the current context has spent waiting for rate limit quota,
+# added to by RateLimitedChatCompletionClient and read by LimiterFeedbackClient
+_quota_wait: contextvars.ContextVar[float] = contextvars.ContextVar("quota_wait", default=0.0)
+
+
+class ChatCompletionClientWrapper(ChatCompletionClient):
+    """
+    Model client that delegates every call to another model client.
+    Subclasses override create/create_stream to add behaviour around the model calls.
+    """
+
+    def __init__(self, client: ChatCompletionClient) -> None:
+        self._client = client
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await self._client.create(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        return self._client.create_stream(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    async def close(self) -> None:
+        await self._client.close()
+
+    def actual_usage(self) -> RequestUsage:
+        return self._client.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self._client.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._client.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._client.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return self._client.capabilities  # type: ignore
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._client.model_info
+
+
+class TimedChatCompletionClient(ChatCompletionClientWrapper):
+    """
+    Record the latency of every model call in the metrics of the current task.
+    The summarization call made by reflect_on_tool_use disables tools and is recorded as "reflection",
+    every other call as "llm_call".
+    """
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        with timed("reflection" if tool_choice == "none" else "llm_call"):
+            return await super().create(
+                messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token,
+            )
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        with timed("reflection" if tool_choice == "none" else "llm_call"):
+            async for chunk in super().create_stream(
+                messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token,
+            ):
+                yield chunk
+
+
+class EarlyStopChatCompletionClient(ChatCompletionClientWrapper):
+    """
+    End the agent turn once the model has issued num_tools tool calls: every later call is answered
+    with a fixed text, without sending it to the provider, and counted as llm_calls_skipped in the metrics
+    of the current task. Only the tool calls are scored, so the final answer the model would write
+    after them does not change the score. Used for one agent, as it counts the calls of its conversation.
+    """
+
+    STOP_MESSAGE = "Scoring-only run: stopped after the required tool calls."
+
+    def __init__(self, client: ChatCompletionClient, num_tools: int) -> None:
+        super().__init__(client)
+        self.num_tools = num_tools
+
+    def tool_calls_issued(self, messages: Sequence[LLMMessage]) -> int:
+        return sum(
+            sum(isinstance(item, FunctionCall) for item in message.content)
+            for message in messages
+            if isinstance(message, AssistantMessage) and isinstance(message.content, list)
+        )
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        if self.tool_calls_issued(messages) >= self.num_tools:
+            add_metric("llm_calls_skipped", 1)
+            return CreateResult(
+                finish_reason="stop",
+                content=self.STOP_MESSAGE,
+                usage=RequestUsage(prompt_tokens=0, completion_tokens=0),
+                cached=False,
+            )
+        return await super().create(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+
+class CachingChatCompletionClient(ChatCompletionClientWrapper):
+    """
+    Answer model calls from a ResponseCache, keyed on the model id, the messages, the tool schemas and the
+    sampling parameters, so that a rerun of the same tasks at temperature 0 does not pay for the same
+    completions again. Hits are returned with cached=True and their original usage.
+    Hits, misses, and the tokens and dollars (with pricing) saved by hits are counted in the metrics of the
+    current task. Streamed calls are passed through without caching.
+    """
+
+    def __init__(
+        self,
+        client: ChatCompletionClient,
+        cache: ResponseCache,
+        model: str,
+        sampling_params: Optional[Mapping[str, Any]] = None,
+        pricing: Optional[Mapping[str, float]] = None,
+    ) -> None:
+        super().__init__(client)
+        self.cache = cache
+        self.model = model
+        self.sampling_params = dict(sampling_params or {})
+        self.pricing = pricing
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        key = request_key(self.model, messages, tools, tool_choice, json_output, extra_create_args, self.sampling_params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            result = CreateResult.model_validate_json(cached)
+            result.cached = True
+            add_metric("llm_cache_hits", 1)
+            add_metric("llm_cache_saved_tokens", result.usage.prompt_tokens + result.usage.completion_tokens)
+            if self.pricing:
+                add_metric("llm_cache_saved_usd", (
+                    result.usage.prompt_tokens * self.pricing.get("prompt", 0)
+                    + result.usage.completion_tokens * self.pricing.get("completion", 0)
+                ) / 1_000_000)
+            return result
+
+        add_metric("llm_cache_misses", 1)
+        result = await super().create(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        self.cache.put(key, result.model_dump_json())
+        return result
+
+
+class LimiterFeedbackClient(ChatCompletionClientWrapper):
+    """
+    Report the latency of every model call, and every call throttled by the provider (429/5xx),
+    to an AdaptiveConcurrencyLimiter. Streamed calls are passed through without feedback.
+    The time a call waits for the quota of a RateLimitedChatCompletionClient is not part of its latency:
+    it measures our own rate limits, not the load of the provider.
+    """
+
+    def __init__(self, client: ChatCompletionClient, limiter: AdaptiveConcurrencyLimiter) -> None:
+        super().__init__(client)
+        self._limiter = limiter
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        start = time.monotonic()
+        _quota_wait.set(0.0)
+        try:
+            result = await super().create(
+                messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token,
+            )
+        except Exception as e:
+            if is_throttle_error(e):
+                self._limiter.on_throttle(e, start)
+            raise
+        self._limiter.on_success(time.monotonic() - start - _quota_wait.get(), start)
+        return result
+
+
+class RateLimitedChatCompletionClient(ChatCompletionClientWrapper):
+    """
+    Enforce the requests-per-minute and tokens-per-minute quotas of a model entry before each call is sent,
+    so that a call waits for quota instead of being rejected by the provider and retried.
+    The token cost of a call is estimated from the prompt size (plus max_tokens, if set) and
+    corrected with the actual usage once the call returns.
+    """
+
+    def __init__(self, client: ChatCompletionClient, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None) -> None:
+        super().__init__(client)
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._can_count_tokens = True
+
+    def estimate_tokens(self, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema], extra_create_args: Mapping[str, Any]) -> int:
+        """Estimate the tokens a call counts against the quota: prompt tokens plus the completion limit, if any."""
+        prompt_tokens = None
+        if self._can_count_tokens:
+            try:
+                prompt_tokens = self._client.count_tokens(messages, tools=tools)
+            except Exception as e:
+                # e.g. the tokenizer cannot be loaded; fall back to ~4 characters per token from now on
+                print(f"Warning: Cannot count tokens, estimating from the prompt length instead: {e}")
+                self._can_count_tokens = False
+        if prompt_tokens is None:
+            prompt_tokens = (sum(len(str(message.content)) for message in messages) + len(str(tools))) // 4
+        completion_tokens = extra_create_args.get("max_tokens") or extra_create_args.get("max_completion_tokens") or 0
+        return prompt_tokens + int(completion_tokens)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        estimate = await self._wait_for_quota(messages, tools, extra_create_args)
+        result = await super().create(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        self._correct_estimate(result, estimate)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        estimate = await self._wait_for_quota(messages, tools, extra_create_args)
+        async for chunk in super().create_stream(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        ):
+            if isinstance(chunk, CreateResult):
+                self._correct_estimate(chunk, estimate)
+            yield chunk
+
+    async def _wait_for_quota(self, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema], extra_create_args: Mapping[str, Any]) -> int:
+        """Wait for one request and the estimated tokens of a call; returns the estimate."""
+        estimate = 0
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait += await self.request_bucket.acquire(1)
+        if self.token_bucket is not None:
+            estimate = self.estimate_tokens(messages, tools, extra_create_args)
+            wait += await self.token_bucket.acquire(estimate)
+        record_timing("rate_limit_wait", wait)
+        _quota_wait.set(_quota_wait.get() + wait)
+        return estimate
+
+    def _correct_estimate(self, result: CreateResult, estimate: int) -> None:
+        if self.token_bucket is not None and result.usage is not None:
+            self.token_bucket.adjust(result.usage.prompt_tokens + result.usage.completion_tokens - estimate)
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Whether a failed model call is worth sending again: timeouts, connection errors, 408/409/429 and 5xx."""
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRYABLE_STATUS_CODES or status >= 500)
+
+
+class RetryingChatCompletionClient(ChatCompletionClientWrapper):
+    """
+    Retry failed model calls and optionally hedge slow ones, so that a transient provider error
+    or a hung request does not fail the whole task:
+    - A call failing with a retryable error is sent again after a jittered exponential backoff
+      (full jitter, at least the Retry-After of the response), up to max_retries times
+    - With request_timeout, an attempt that takes longer is abandoned and retried
+    - With hedge, once hedge_min_samples calls have completed, a call still running after the observed
+      hedge_percentile latency gets a duplicate, and whichever answers first is used
+    Retries, hedges and hedges won by the duplicate are counted in the metrics of the current task.
+    Streamed calls are passed through unchanged.
+    """
+
+    def __init__(
+        self,
+        client: ChatCompletionClient,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        request_timeout: Optional[float] = None,
+        hedge: bool = False,
+        hedge_percentile: float = 95,
+        hedge_min_samples: int = 20,
+    ) -> None:
+        super().__init__(client)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.request_timeout = request_timeout
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies: deque = deque(maxlen=HEDGE_LATENCY_WINDOW)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        kwargs = dict(
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(messages, kwargs)
+            except Exception as e:
+                cancelled = cancellation_token is not None and cancellation_token.is_cancelled()
+                if attempt >= self.max_retries or cancelled or not is_retryable_error(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                add_metric("llm_retries", 1)
+                print(f"Warning: Model call failed with {type(e).__name__}: {e}; retry {attempt}/{self.max_retries} in {delay:.1f} s")
+                await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        response = getattr(error, "response", None)
+        try:
+            retry_after = float(response.headers.get("retry-after"))
+            delay = max(delay, min(retry_after, self.max_delay))
+        except (AttributeError, TypeError, ValueError):
+            pass
+        return delay
+
+    async def _attempt(self, messages: Sequence[LLMMessage], kwargs: Dict[str, Any]) -> CreateResult:
+        start = time.monotonic()
+        if self.hedge and len(self._latencies) >= self.hedge_min_samples:
+            result = await self._hedged_call(messages, kwargs, percentile(list(self._latencies), self.hedge_percentile))
+        else:
+            result = await self._call(messages, kwargs)
+        self._latencies.append(time.monotonic() - start)
+        return result
+
+    async def _call(self, messages: Sequence[LLMMessage], kwargs: Dict[str, Any]) -> CreateResult:
+        if self.request_timeout is None:
+            return await super().create(messages, **kwargs)
+        return await asyncio.wait_for(super().create(messages, **kwargs), timeout=self.request_timeout)
+
+    async def _hedged_call(self, messages: Sequence[LLMMessage], kwargs: Dict[str, Any], hedge_after: float) -> CreateResult:
+        primary = asyncio.create_task(self._call(messages, kwargs))
+        calls = {primary}
+        try:
+            done, _ = await asyncio.wait(calls, timeout=hedge_after)
+            if not done:
+                add_metric("llm_hedges", 1)
+                calls.add(asyncio.create_task(self._call(messages, kwargs)))
+            error = None
+            while calls:
+                done, calls = await asyncio.wait(calls, return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    if call.exception() is None:
+                        if call is not primary:
+                            add_metric("llm_hedge_wins", 1)
+                        return call.result()
+                    error = error or call.exception()
+            raise error
+        finally:
+            for call in calls:
+                call.cancel()
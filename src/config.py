@@ -2,99 +2,181 @@ import json
 import os
 from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
+from autogen_core.models import ChatCompletionClient
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 
+from .clients import RateLimitedChatCompletionClient
+from .httppool import HttpClientPool
+from .oracle import ORACLE_MODEL, OracleChatCompletionClient
+
 # load environment variables
 load_dotenv()
 
 api_key = os.getenv("API_KEY")
 
+# Base URL of entries without api_base/base_url
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
 class ModelRegistry:
     """
     Manage multiple model clients:
     - Read {model, api_key, api_base/base_url, name} from configs/config.json
     - If api_key is not provided, fall back to environment variable OPENAI_API_KEY
+    - Optional requests_per_minute/tokens_per_minute quotas are enforced by a token bucket around the client
+    - Optional price_per_million_tokens {"prompt", "completion"} (in dollars) is kept for cost reports
+    - All entries with the same base URL share one pooled HTTP client, tuned by an optional "http_pool" object
+      (max_connections, max_keepalive_connections, keepalive_expiry, http2, timeout, connect_timeout;
+      see HTTP_POOL_DEFAULTS), the first entry setting a key wins; connection_stats() reports the reuse
+    - "model": "oracle" is the offline OracleChatCompletionClient, configured with tasks_path, latency, jitter,
+      prompt_tokens and completion_tokens; get("oracle") returns a default one if none is configured, and
+      get(..., tasks=...) has it answer the tasks of the run, whatever their task file
     - Expose a method to get a client by name/model
+    Entries are only parsed when the config is read; the client of an entry is created on its first get()
+    and reused afterwards, so a run pays only for the models it uses. close() closes the created clients.
+    sdk_retries sets the retries of the OpenAI SDK itself (None keeps its default of 2); runs that wrap
+    the clients in a RetryingChatCompletionClient pass 0, so that a failed call is retried in one place.
+    quota_share scales the requests_per_minute/tokens_per_minute quotas, for processes that share them,
+    e.g. 1/num_workers in every worker of a sharded run.
     """
 
-    def __init__(self, config_path: str = "configs/config.json") -> None:
+    def __init__(self, config_path: str = "configs/config.json", sdk_retries: Optional[int] = None, quota_share: float = 1.0) -> None:
+        self._sdk_retries = sdk_retries
+        self._quota_share = quota_share
         self._entries: List[Dict[str, Any]] = []
         self._name_to_entry: Dict[str, Dict[str, Any]] = {}
         self._model_to_entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._http_pool_settings: Dict[str, Dict[str, Any]] = {}
+        self._http_clients = HttpClientPool()
         self._load(config_path)
 
     def _load(self, config_path: str) -> None:
-        if not os.path.exists(config_path):
-            entry = {
-                "name": "openai_default",
-                "model": "gpt-4o-mini",
-                "client": OpenAIChatCompletionClient(
-                    model="gpt-4o-mini",
-                    api_key=api_key
-                    ),
-            }
-            self._entries = [entry]
-            self._name_to_entry[entry["name"]] = entry
-            self._model_to_entries.setdefault(entry["model"], []).append(entry)
-            return
-
-        with open(config_path, "r", encoding="utf-8") as f:
-            cfg_list = json.load(f)
+        cfg_list = []
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                cfg_list = json.load(f)
 
         for idx, cfg in enumerate(cfg_list):
             model = cfg.get("model") or "gpt-4o-mini"
-            base_url = cfg.get("api_base") or cfg.get("base_url")
             name_raw = cfg.get("name") or f"client_{idx}_{model}"
-            model_info = cfg.get("model_info")
             temperature = cfg.get("temperature")
             # ensure the name is a valid Python identifier
             name = name_raw.replace("-", "_").replace(" ", "_")
             if not (name[0].isalpha() or name[0] == "_"):
                 name = f"m_{name}"
+            base_url = cfg.get("api_base") or cfg.get("base_url") or OPENAI_BASE_URL
+            pool_settings = self._http_pool_settings.setdefault(base_url, {})
+            for key, value in (cfg.get("http_pool") or {}).items():
+                pool_settings.setdefault(key, value)
+            self._add_entry({
+                "name": name,
+                "model": model,
+                "base_url": base_url,
+                "config": cfg,
+                # Parameters that change the completions of the model, e.g. for cache keys
+                "sampling_params": {"temperature": temperature} if temperature is not None else {},
+                "pricing": cfg.get("price_per_million_tokens"),
+            })
+
+        if not self._entries:
+            self._add_entry({
+                "name": "openai_default",
+                "model": "gpt-4o-mini",
+                "base_url": OPENAI_BASE_URL,
+                "config": {"model": "gpt-4o-mini", "temperature": 0},
+                "sampling_params": {"temperature": 0},
+                "pricing": None,
+            })
+
+    def _add_entry(self, entry: Dict[str, Any]) -> None:
+        self._entries.append(entry)
+        self._name_to_entry[entry["name"]] = entry
+        self._model_to_entries.setdefault(entry["model"], []).append(entry)
+
+    def _create_client(self, entry: Dict[str, Any]) -> ChatCompletionClient:
+        cfg = entry["config"]
+        model = cfg.get("model") or "gpt-4o-mini"
+        if model == ORACLE_MODEL:
+            client = entry["oracle"] = OracleChatCompletionClient(
+                tasks_path=cfg.get("tasks_path", "data/tasks.json"),
+                latency=cfg.get("latency", 1.0),
+                jitter=cfg.get("jitter", 0.0),
+                prompt_tokens=cfg.get("prompt_tokens"),
+                completion_tokens=cfg.get("completion_tokens", 50),
+            )
+        else:
+            base_url = cfg.get("api_base") or cfg.get("base_url")
+            # Connections are pooled per base URL across all models of the provider
+            http_client = self._http_clients.get(base_url or OPENAI_BASE_URL, self._http_pool_settings.get(base_url or OPENAI_BASE_URL))
+            client_kwargs = {"model": model, "api_key": api_key, "http_client": http_client}
 
-            client_kwargs = {"model": model, "api_key": api_key}
-            
             if base_url:
                 client_kwargs["base_url"] = base_url
 
-            if temperature:
-                client_kwargs["temperature"] = temperature
-            
+            if self._sdk_retries is not None:
+                client_kwargs["max_retries"] = self._sdk_retries
+
+            # temperature 0 must be sent too, the provider default is usually higher
+            if cfg.get("temperature") is not None:
+                client_kwargs["temperature"] = cfg["temperature"]
+
             # Always provide model_info for non-standard models
-            if model_info:
-                client_kwargs["model_info"] = model_info
-            
+            if cfg.get("model_info"):
+                client_kwargs["model_info"] = cfg["model_info"]
+
+            client = OpenAIChatCompletionClient(**client_kwargs)
+
+        # Calls wait for quota before they are sent; processes sharing the quota each get their share
+        requests_per_minute = cfg.get("requests_per_minute")
+        tokens_per_minute = cfg.get("tokens_per_minute")
+        if requests_per_minute or tokens_per_minute:
+            client = RateLimitedChatCompletionClient(
+                client,
+                requests_per_minute * self._quota_share if requests_per_minute else None,
+                tokens_per_minute * self._quota_share if tokens_per_minute else None,
+            )
+        return client
+
+    def get(self, name_or_model: Optional[str] = None, tasks: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Get the entry of a model by name or model id, with its client in entry["client"].
+        Unknown names get the first entry. The client is created on the first call.
+        tasks are the tasks of the run, which the oracle answers with their expected tool calls;
+        other clients ignore them.
+        """
+        if not name_or_model:
+            entry = self._entries[0]
+        elif name_or_model in self._name_to_entry:
+            entry = self._name_to_entry[name_or_model]
+        elif name_or_model in self._model_to_entries:
+            entry = self._model_to_entries[name_or_model][0]
+        elif name_or_model == ORACLE_MODEL:
+            # The oracle needs no configuration, so it is available without an entry
+            entry = {"name": ORACLE_MODEL, "model": ORACLE_MODEL, "base_url": None, "config": {"model": ORACLE_MODEL}, "sampling_params": {}, "pricing": None}
+            self._add_entry(entry)
+        else:
+            entry = self._entries[0]
+
+        if "client" not in entry:
             try:
-                entry = {
-                    "name": name,
-                    "model": model,
-                    "client": OpenAIChatCompletionClient(**client_kwargs),
-                }
-                self._entries.append(entry)
-                self._name_to_entry[name] = entry
-                self._model_to_entries.setdefault(model, []).append(entry)
+                entry["client"] = self._create_client(entry)
             except Exception as e:
-                print(f"Warning: Failed to create client for model {model}: {e}")
-                # Skip this model and continue with others
-                continue
+                raise ValueError(f"Failed to create client for model {entry['model']}: {e}") from e
+        if tasks is not None and "oracle" in entry:
+            entry["oracle"].add_tasks(tasks)
+        return entry
 
-        if not self._entries:
-            entry = {
-                "name": "openai_default",
-                "model": "gpt-4o-mini",
-                "client": OpenAIChatCompletionClient(
-                    model="gpt-4o-mini", api_key=api_key, temperature=0
-                ),
-            }
-            self._entries = [entry]
-            self._name_to_entry[entry["name"]] = entry
-            self._model_to_entries.setdefault(entry["model"], []).append(entry)
-
-    def get(self, name_or_model: Optional[str] = None) -> Dict[str, Any]:
-        if not name_or_model:
-            return self._entries[0]
-        if name_or_model in self._name_to_entry:
-            return self._name_to_entry[name_or_model]
-        if name_or_model in self._model_to_entries:
-            return self._model_to_entries[name_or_model][0]
-        return self._entries[0]
+    def connection_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Requests, new connections, TLS handshakes and connection reuse rate of the shared HTTP clients, per base URL."""
+        return self._http_clients.stats()
+
+    async def close(self) -> None:
+        """Close the clients created so far and their HTTP clients; a later get() creates a new client."""
+        for entry in self._entries:
+            client = entry.pop("client", None)
+            entry.pop("oracle", None)
+            if client is not None:
+                try:
+                    await client.close()
+                except Exception as e:
+                    print(f"Warning: Failed to close client for model {entry['model']}: {e}")
+        await self._http_clients.close()
@@ -0,0 +1,355 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from collections import deque
+
+from .agenttest import build_model_client, load_completed_responses, process_single_task, run_options
+from .catalog import build_tool_catalog
+from .config import ModelRegistry
+from .scheduler import estimate_task_costs, load_task_history
+from .serverpool import ProcessBudget, create_server_pool
+from .utilities import JsonlWriter, configure_logging, load_data, save_ordered_view
+
+
+DEFAULT_PORT = 8765
+# A lease is renewed by its worker every third of this; a lease not renewed in time is given to another worker
+LEASE_TIMEOUT = 60
+# Largest message accepted, a response record with all its inner messages must fit
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+# How long a worker waits before asking again when every remaining task is leased
+POLL_INTERVAL = 5
+# How long the coordinator keeps answering "done" after the last result, so that idle workers learn it
+DONE_LINGER = 2 * POLL_INTERVAL
+
+
+class Coordinator:
+    """
+    Serve the tasks of a run to workers over TCP and collect their responses into one log.
+    Every message is a single JSON line on its own connection, answered by a single JSON line:
+    - {"type": "lease"} -> {"type": "task", "lease_id", "task", "task_index", ...}, "wait" or "done"
+    - {"type": "renew", "lease_id"} -> {"type": "ok"}, extends the lease while the task runs
+    - {"type": "result", "lease_id", "response"} -> {"type": "ok"}, the response is appended to the log
+    A task whose lease expires goes back to the queue, so the tasks of a dead worker are run again elsewhere.
+    """
+
+    def __init__(self, tasks, output_path, lease_timeout=LEASE_TIMEOUT, token=None, resume_from=None, rerun_errors=False, schedule="file"):
+        self.tasks = tasks
+        self.output_path = output_path
+        self.jsonl_path = os.path.splitext(output_path)[0] + ".jsonl"
+        self.lease_timeout = lease_timeout
+        self.token = token
+        self.task_indexes = {task["id"]: index for index, task in enumerate(tasks)}
+        self.completed = load_completed_responses(resume_from, tasks, rerun_errors) if resume_from else {}
+        self.pending = deque(index for index, task in enumerate(tasks) if task["id"] not in self.completed)
+        if schedule == "lejf":
+            # Longest expected job first, from the times of all models in earlier logs
+            costs = estimate_task_costs(tasks, load_task_history())
+            self.pending = deque(sorted(self.pending, key=lambda index: -costs[index]))
+        self.leases = {}
+        self.done = set(self.completed)
+        self.workers = set()
+        self.reassigned = 0
+        self.errors = 0
+        self._finished = asyncio.Event()
+        self._log_writer = None
+
+    def _expire_leases(self):
+        now = time.monotonic()
+        for lease_id, lease in list(self.leases.items()):
+            if lease["deadline"] < now:
+                del self.leases[lease_id]
+                if self.tasks[lease["index"]]["id"] not in self.done:
+                    print(f"Lease of task {lease['index'] + 1} by worker {lease['worker']} expired, reassigning it")
+                    self.pending.appendleft(lease["index"])
+                    self.reassigned += 1
+
+    async def _handle_message(self, message):
+        if self.token is not None and message.get("token") != self.token:
+            return {"type": "error", "error": "invalid token"}
+
+        kind = message.get("type")
+        if kind == "lease":
+            self.workers.add(message.get("worker"))
+            self._expire_leases()
+            if self._finished.is_set():
+                return {"type": "done"}
+            if not self.pending:
+                return {"type": "wait", "seconds": POLL_INTERVAL}
+            index = self.pending.popleft()
+            lease_id = uuid.uuid4().hex
+            self.leases[lease_id] = {
+                "index": index,
+                "worker": message.get("worker"),
+                "deadline": time.monotonic() + self.lease_timeout,
+            }
+            return {
+                "type": "task",
+                "lease_id": lease_id,
+                "task": self.tasks[index],
+                "task_index": index,
+                "total_tasks": len(self.tasks),
+                "lease_timeout": self.lease_timeout,
+            }
+
+        if kind == "renew":
+            lease = self.leases.get(message.get("lease_id"))
+            if lease is None:
+                return {"type": "error", "error": "unknown or expired lease"}
+            lease["deadline"] = time.monotonic() + self.lease_timeout
+            return {"type": "ok"}
+
+        if kind == "result":
+            lease = self.leases.pop(message.get("lease_id"), None)
+            response = message.get("response") or {}
+            task_id = response.get("task_id")
+            # A late result of an expired lease is still valid, unless another worker answered first
+            if task_id in self.done or task_id not in self.task_indexes:
+                return {"type": "ok"}
+            self.done.add(task_id)
+            if lease is None and self.task_indexes[task_id] in self.pending:
+                self.pending.remove(self.task_indexes[task_id])
+            if "error" in response:
+                self.errors += 1
+            await self._log_writer.write(response)
+            print(f"Result of task {response.get('task_index')} ({task_id}) received: {len(self.done)}/{len(self.tasks)} done")
+            if len(self.done) == len(self.tasks):
+                self._finished.set()
+            return {"type": "ok"}
+
+        return {"type": "error", "error": f"unknown message type: {kind}"}
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            message = json.loads(await reader.readline())
+            reply = await self._handle_message(message)
+            writer.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+            await writer.drain()
+        except Exception as e:
+            print(f"Warning: Bad request from a worker: {type(e).__name__}: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """
+        Serve the tasks until every task has a response, then write the ordered log.
+
+        Returns:
+            str: Path of the ordered log
+        """
+        start = time.time()
+        async with JsonlWriter(self.jsonl_path) as log_writer:
+            self._log_writer = log_writer
+            for response in self.completed.values():
+                await log_writer.write(response)
+            if len(self.done) == len(self.tasks):
+                self._finished.set()
+
+            server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_MESSAGE_BYTES)
+            print(f"Coordinator serving {len(self.pending)} of {len(self.tasks)} tasks on {host}:{port}")
+            async with server:
+                await self._finished.wait()
+                await asyncio.sleep(DONE_LINGER)
+
+        save_ordered_view(self.jsonl_path, self.output_path)
+        print(f"\n{'='*80}")
+        print(f"Distributed execution completed in {time.time() - start:.2f} seconds")
+        print(f"Tasks: {len(self.tasks)} ({len(self.completed)} resumed), errors: {self.errors}, "
+              f"workers: {len(self.workers)}, leases reassigned: {self.reassigned}")
+        print(f"All response data saved to: {self.output_path}")
+        print(f"{'='*80}\n")
+        return self.output_path
+
+
+async def send_message(host, port, message, token=None):
+    """Send one message to the coordinator and return its reply."""
+    if token is not None:
+        message = dict(message, token=token)
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_MESSAGE_BYTES)
+    try:
+        writer.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+    finally:
+        writer.close()
+    if reply.get("type") == "error":
+        raise RuntimeError(f"Coordinator refused {message.get('type')}: {reply.get('error')}")
+    return reply
+
+
+async def run_worker(host, port, model, concurrency=10, num_servers=10, token=None, connect_timeout=60, options=None, **overrides):
+    """
+    Pull tasks from a coordinator, run them with process_single_task and send back the responses.
+    The worker runs up to concurrency tasks at a time and stops when the coordinator has no tasks left.
+
+    Args:
+        host: Host of the coordinator
+        port: Port of the coordinator
+        model: Model name to use
+        concurrency: Number of tasks run at the same time by this worker
+        num_servers: Number of servers required for agent construction
+        token: Shared token expected by the coordinator, if any
+        connect_timeout: How long to keep retrying while the coordinator cannot be reached
+        options: Run options of this worker, see run_options; max_server_processes applies to this worker,
+            schedule and rerun_errors are options of the coordinator, prefetch_depth and adaptive_concurrency
+            are not used by workers. Every worker enforces the RPM/TPM quotas of the config on its own, so
+            workers sharing an API key should each get a quota_share, e.g. 0.5 for each of two workers
+        overrides: Run options given as keyword arguments
+
+    Returns:
+        int: Number of tasks run by this worker
+    """
+    options = run_options(options, **overrides)
+    configure_logging()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    model_registry = ModelRegistry("configs/config.json", sdk_retries=0, quota_share=options["quota_share"])
+    llm = model_registry.get(model)
+    client, response_cache = build_model_client(llm, options)
+    tool_catalog = await build_tool_catalog() if options["use_catalog"] else None
+    process_budget = ProcessBudget(options["max_server_processes"])
+    server_pool = create_server_pool(options["backend"], process_budget) if options["session_scope"] == "run" else None
+    tasks_run = 0
+
+    async def request(message):
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                return await send_message(host, port, message, token)
+            except OSError as e:
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f"Coordinator {host}:{port} unreachable: {e}")
+                await asyncio.sleep(1)
+
+    async def keep_renewing(lease_id, lease_timeout):
+        while True:
+            await asyncio.sleep(lease_timeout / 3)
+            try:
+                await request({"type": "renew", "lease_id": lease_id})
+            except Exception as e:
+                print(f"Warning: Renewing lease {lease_id} failed: {e}")
+
+    async def slot():
+        nonlocal tasks_run
+        while True:
+            try:
+                reply = await request({"type": "lease", "worker": worker_id})
+            except ConnectionError:
+                # The coordinator stops shortly after the last result
+                return
+            if reply["type"] == "done":
+                return
+            if reply["type"] == "wait":
+                await asyncio.sleep(reply["seconds"])
+                continue
+
+            # The oracle answers the tasks of the coordinator's task file, which the worker only sees per lease
+            model_registry.get(model, tasks=[reply["task"]])
+            renewer = asyncio.create_task(keep_renewing(reply["lease_id"], reply["lease_timeout"]))
+            try:
+                response = await process_single_task(
+                    client=client,
+                    task=reply["task"],
+                    num_servers=num_servers,
+                    task_index=reply["task_index"],
+                    total_tasks=reply["total_tasks"],
+                    server_pool=server_pool,
+                    tool_catalog=tool_catalog,
+                    backend=options["backend"],
+                    process_budget=process_budget,
+                    scoring_only=options["scoring_only"],
+                    seed_servers=bool(options["llm_cache"]),
+                )
+            finally:
+                renewer.cancel()
+            response["worker"] = worker_id
+            await request({"type": "result", "lease_id": reply["lease_id"], "response": response})
+            tasks_run += 1
+
+    print(f"Worker {worker_id} pulling tasks from {host}:{port} with concurrency {concurrency}")
+    try:
+        await asyncio.gather(*(slot() for _ in range(concurrency)))
+    finally:
+        if server_pool is not None:
+            await server_pool.close()
+        if response_cache is not None:
+            response_cache.close()
+        await model_registry.close()
+    print(f"Worker {worker_id} finished after running {tasks_run} tasks")
+    return tasks_run
+
+
+def main():
+    """
+    Command line entry point, e.g. with two workers on the local machine:
+        python -m src.distributed coordinator --output logs/model_response_distributed.json
+        python -m src.distributed worker --model qwen/qwen3-32b --concurrency 5 --quota-share 0.5
+        python -m src.distributed worker --model qwen/qwen3-32b --concurrency 5 --quota-share 0.5
+    Across machines, start the coordinator with --host 0.0.0.0 and the workers with --host <coordinator>,
+    and set the same --token (or MCPBENCH_TOKEN) everywhere.
+    """
+    parser = argparse.ArgumentParser(description="Run a benchmark across several machines.")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    coordinator = subparsers.add_parser("coordinator", help="Serve tasks to workers and collect the responses")
+    coordinator.add_argument("--tasks", default="data/tasks.json")
+    coordinator.add_argument("--output", required=True, help="Path of the response log")
+    coordinator.add_argument("--host", default="127.0.0.1")
+    coordinator.add_argument("--port", type=int, default=DEFAULT_PORT)
+    coordinator.add_argument("--lease-timeout", type=float, default=LEASE_TIMEOUT)
+    coordinator.add_argument("--resume-from", default=None)
+    coordinator.add_argument("--rerun-errors", action="store_true")
+    coordinator.add_argument("--schedule", choices=["file", "lejf"], default="file")
+    coordinator.add_argument("--token", default=os.getenv("MCPBENCH_TOKEN"))
+
+    worker = subparsers.add_parser("worker", help="Pull tasks from a coordinator and run them")
+    worker.add_argument("--model", required=True)
+    worker.add_argument("--host", default="127.0.0.1")
+    worker.add_argument("--port", type=int, default=DEFAULT_PORT)
+    worker.add_argument("--concurrency", type=int, default=10)
+    worker.add_argument("--num-servers", type=int, default=10)
+    worker.add_argument("--backend", default="stdio")
+    worker.add_argument("--max-server-processes", type=int, default=None)
+    worker.add_argument("--no-catalog", action="store_true")
+    worker.add_argument("--session-scope", choices=["run", "agent"], default="run")
+    worker.add_argument("--llm-retries", type=int, default=3)
+    worker.add_argument("--request-timeout", type=float, default=None)
+    worker.add_argument("--hedge", action="store_true")
+    worker.add_argument("--llm-cache", default=None, help="Path of a SQLite response cache")
+    worker.add_argument("--llm-cache-max-mb", type=int, default=1024)
+    worker.add_argument("--quota-share", type=float, default=1.0,
+                        help="Share of each model's RPM/TPM quota used by this worker, e.g. 0.5 for each of two workers sharing an API key")
+    worker.add_argument("--scoring-only", action="store_true", help="Skip the model calls after the required tool calls")
+    worker.add_argument("--token", default=os.getenv("MCPBENCH_TOKEN"))
+
+    args = parser.parse_args()
+    if args.mode == "coordinator":
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        server = Coordinator(load_data(args.tasks), args.output, args.lease_timeout, args.token, args.resume_from, args.rerun_errors, args.schedule)
+        asyncio.run(server.serve(args.host, args.port))
+    else:
+        asyncio.run(run_worker(
+            args.host, args.port, args.model,
+            concurrency=args.concurrency,
+            num_servers=args.num_servers,
+            token=args.token,
+            options={
+                "use_catalog": not args.no_catalog,
+                "backend": args.backend,
+                "session_scope": args.session_scope,
+                "max_server_processes": args.max_server_processes,
+                "llm_retries": args.llm_retries,
+                "request_timeout": args.request_timeout,
+                "hedge": args.hedge,
+                "scoring_only": args.scoring_only,
+                "llm_cache": args.llm_cache,
+                "llm_cache_max_mb": args.llm_cache_max_mb,
+                "quota_share": args.quota_share,
+            },
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from .utilities import *
 from .evaluate import *
 from .config import *
 from .agenttest import *
+from .sharded import *
 import os
 import datetime
 
@@ -39,29 +40,90 @@ def get_experiment_config(model, tasks_type):
     return log_path, task_path, output_path
 
 
-async def run_experiment(model, tasks_type, concurrency=10, num_servers=10):
+async def run_experiment(model, tasks_type, concurrency=10, num_servers=10, resume_from=None, num_workers=1, compare_to=None, options=None, **overrides):
     """
     Run the benchmark.
 
     Args:
-        model: The model to test.
+        model: The model to test, or a list of models to test in one run. The models then share the tasks,
+            tool catalog and server processes, and each model gets its own concurrency.
         tasks_type: The type of tasks to test.
-        concurrency: The number of concurrent requests to send.
+        concurrency: The number of concurrent requests to send (per model), the starting point with adaptive_concurrency.
         num_servers: The number of servers for agent construction.
-    """
+        resume_from: The log of an interrupted run to resume (a dict of logs keyed by model for a list of models).
+            Its answered tasks are reused and only the missing tasks are run; the merged log is written as a new log.
+        num_workers: The number of worker processes; above 1, the tasks are sharded by task id across the
+            workers, each with its own event loop, server pool and model client, and the logs are merged.
+        compare_to: The log of an earlier run of the same tasks (a dict of logs keyed by model for a list of models)
+            to report the token, latency and model call savings against, e.g. a normal run for a scoring_only run.
+        options: The run options, e.g. {"backend": "inmemory", "llm_cache": "cache/llm.sqlite"}; see run_options
+            for all of them (backend, session_scope, max_server_processes, prefetch_depth, adaptive_concurrency,
+            max_concurrency, rerun_errors, schedule, llm_retries, request_timeout, hedge, scoring_only, llm_cache, ...).
+        overrides: Run options given as keyword arguments, e.g. scoring_only=True.
 
-    scores = []
-    detailed_results = []
-    tools_summed_up = []
+    Returns:
+        The model score, or a dict of model scores if a list of models was given.
+    """
+    options = run_options(options, **overrides)
 
-    log_path, task_path, output_path = get_experiment_config(model, tasks_type)
     # Create logs directory if it doesn't exist
     os.makedirs("logs", exist_ok=True)
-    # Generate responses
-    await generate_responses_concurrent(model, task_path, log_path, concurrency, num_servers)
+
+    if isinstance(model, str) and compare_to:
+        compare_to = {model: compare_to}
+
+    if isinstance(model, str) and num_workers <= 1:
+        log_path, task_path, output_path = get_experiment_config(model, tasks_type)
+        # Generate responses
+        await generate_responses_concurrent(model, task_path, log_path, concurrency, num_servers, options, resume_from)
+        baseline_data = load_data(compare_to[model]) if compare_to else None
+        return evaluate_responses(load_data(task_path), load_data(log_path), output_path, baseline_data)
+
+    single_model = isinstance(model, str)
+    models = [model] if single_model else list(dict.fromkeys(model))
+    if single_model and resume_from:
+        resume_from = {model: resume_from}
+    experiment_configs = {m: get_experiment_config(m, tasks_type) for m in models}
+    task_path = experiment_configs[models[0]][1]
+    log_paths = {m: experiment_configs[m][0] for m in models}
+    if num_workers > 1:
+        # Shard the tasks across worker processes
+        completed = await generate_responses_sharded(models, task_path, log_paths, concurrency, num_servers, num_workers, options, resume_from)
+    else:
+        # Generate the responses of all models at the same time
+        completed = await generate_responses_multi(models, task_path, log_paths, concurrency, num_servers, options, resume_from)
 
     task_data = load_data(task_path)
-    response_data = load_data(log_path)
+    model_scores = {}
+    for m in models:
+        if m not in completed:
+            continue
+        print(f"\n📊 Evaluating {m}")
+        baseline_data = load_data(compare_to[m]) if (compare_to or {}).get(m) else None
+        model_scores[m] = evaluate_responses(task_data, load_data(log_paths[m]), experiment_configs[m][2], baseline_data)
+    if single_model:
+        return model_scores.get(model)
+    return model_scores
+
+
+def evaluate_responses(task_data, response_data, output_path, baseline_data=None):
+    """
+    Score the responses of a run against the tasks and save the detailed results.
+
+    Args:
+        task_data: The tasks, in the order of the responses.
+        response_data: The responses generated for the tasks.
+        output_path: The path to the result file.
+        baseline_data: The responses of an earlier run of the same tasks to compare the cost of this run with.
+
+    Returns:
+        model_score: The model score.
+    """
+
+    scores = []
+    detailed_results = []
+    tools_summed_up = []
+
     num_tasks = len(task_data)
     num_empty_responses = 0
     num_success_tasks = 0
@@ -124,6 +186,9 @@ async def run_experiment(model, tasks_type, concurrency=10, num_servers=10):
 
     average_time = calculate_total_time(response_data)
     average_time = average_time / (len(response_data) - num_empty_responses)
+
+    phase_timings = calculate_phase_timings(response_data)
+    cache_stats = calculate_cache_stats(response_data)
     
     # Print summary
     print("\n" + "=" * 50)
@@ -134,6 +199,21 @@ async def run_experiment(model, tasks_type, concurrency=10, num_servers=10):
     print(f"Tasks Failed: {len(scores) - num_success_tasks}")
     print(f"Model Score: {model_score}")
     print(f"full marks: {full_marks}")
+    if phase_timings:
+        print("Phase timings (seconds):")
+        for phase, stats in phase_timings.items():
+            print(f"  {phase:<12} n={stats['count']:<5} p50={stats['p50']:.3f} p95={stats['p95']:.3f} p99={stats['p99']:.3f}")
+    if cache_stats:
+        print(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+              f"(hit rate {cache_stats['hit_rate']:.1%}), {cache_stats['saved_tokens']} tokens and ${cache_stats['saved_usd']:.4f} saved")
+    comparison = compare_runs(baseline_data, response_data) if baseline_data is not None else None
+    if comparison:
+        baseline, run, savings = comparison['baseline'], comparison['run'], comparison['savings']
+        print(f"Compared with the baseline run on {comparison['tasks']} tasks:")
+        print(f"  tokens      {baseline['total_tokens']} -> {run['total_tokens']} ({savings['total_tokens']}% saved)")
+        print(f"  model calls {baseline['llm_calls']} -> {run['llm_calls']} ({savings['llm_calls']}% saved)")
+        print(f"  task time   avg {baseline['average_time']:.2f}s -> {run['average_time']:.2f}s ({savings['average_time']}% saved), "
+              f"p95 {baseline['p95_time']:.2f}s -> {run['p95_time']:.2f}s ({savings['p95_time']}% saved)")
 
     # Show passed tasks summary
     passed_tasks = [r for r in detailed_results if r['match']]
@@ -150,8 +230,13 @@ async def run_experiment(model, tasks_type, concurrency=10, num_servers=10):
         'tasks_failed': len(scores) - num_success_tasks,
         'model_score': model_score,
         'average_tokens': average_tokens,
-        'average_time': average_time
+        'average_time': average_time,
+        'phase_timings': phase_timings
     }
+    if cache_stats:
+        evaluation_summary['llm_cache'] = cache_stats
+    if comparison:
+        evaluation_summary['comparison'] = comparison
 
     results_summary = {
         'evaluation_summary': evaluation_summary,
@@ -0,0 +1,103 @@
+from typing import Any, Dict, Mapping, Optional
+
+import httpx
+import openai
+
+try:
+    import h2  # noqa: F401  HTTP/2 support of httpx
+except ImportError:  # optional dependency, install httpx[http2]
+    h2 = None
+
+
+# Pool settings of a base URL, overridden by the "http_pool" object of its entries in configs/config.json.
+# Idle connections are kept for 30 s rather than httpx's 5 s, as tool calls often separate two model calls.
+HTTP_POOL_DEFAULTS = {
+    "max_connections": 1000,
+    "max_keepalive_connections": 100,
+    "keepalive_expiry": 30.0,
+    "http2": False,
+    "timeout": 600.0,
+    "connect_timeout": 5.0,
+}
+
+
+class CountingTransport(httpx.AsyncHTTPTransport):
+    """HTTP transport counting requests, new TCP connections and TLS handshakes, from the httpcore trace events."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == "connection.connect_tcp.complete":
+                self.connections += 1
+            elif event_name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+            if outer_trace is not None:
+                await outer_trace(event_name, info)
+
+        request.extensions = dict(request.extensions, trace=trace)
+        return await super().handle_async_request(request)
+
+
+class HttpClientPool:
+    """
+    One pooled async HTTP client per base URL, shared by all model clients of that URL,
+    so that concurrent calls reuse connections instead of each client opening its own.
+    """
+
+    def __init__(self) -> None:
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, CountingTransport] = {}
+
+    def get(self, base_url: str, settings: Optional[Mapping[str, Any]] = None) -> httpx.AsyncClient:
+        """
+        Shared HTTP client of a base URL, created on the first call with the given pool settings.
+
+        Args:
+            base_url: Base URL of the provider
+            settings: Overrides of HTTP_POOL_DEFAULTS
+        """
+        if base_url not in self._clients:
+            options = dict(HTTP_POOL_DEFAULTS, **(settings or {}))
+            if options["http2"] and h2 is None:
+                print(f"Warning: HTTP/2 requested for {base_url} but the h2 package is not installed, using HTTP/1.1")
+                options["http2"] = False
+            transport = CountingTransport(
+                http2=options["http2"],
+                limits=httpx.Limits(
+                    max_connections=options["max_connections"],
+                    max_keepalive_connections=options["max_keepalive_connections"],
+                    keepalive_expiry=options["keepalive_expiry"],
+                ),
+            )
+            self._transports[base_url] = transport
+            self._clients[base_url] = openai.DefaultAsyncHttpxClient(
+                transport=transport,
+                timeout=httpx.Timeout(options["timeout"], connect=options["connect_timeout"]),
+            )
+        return self._clients[base_url]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Requests, new connections, TLS handshakes and the share of requests sent on a reused connection, per base URL."""
+        return {
+            base_url: {
+                "requests": transport.requests,
+                "connections": transport.connections,
+                "tls_handshakes": transport.tls_handshakes,
+                "reuse_rate": round(1 - transport.connections / transport.requests, 4) if transport.requests else 0,
+            }
+            for base_url, transport in self._transports.items()
+        }
+
+    async def close(self) -> None:
+        """Close the HTTP clients; their stats are kept until a client of the same base URL is created again."""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
@@ -0,0 +1,119 @@
+import asyncio
+import importlib.util
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import jsonschema
+from autogen_core import CancellationToken
+from autogen_ext.tools.mcp import StdioMcpToolAdapter, StdioServerParams
+from mcp import Tool
+from mcp.server.fastmcp import FastMCP
+from mcp.types import TextContent
+from pydantic import BaseModel
+
+from .metrics import timed
+
+
+def load_server_module(server_path: str) -> FastMCP:
+    """
+    Import a server file as a module and return its FastMCP instance.
+
+    Args:
+        server_path: Path to the server file
+
+    Returns:
+        FastMCP: The server instance defined in the module
+
+    Raises:
+        ValueError: If the module does not define a FastMCP instance
+    """
+    module_name = f"servers.{Path(server_path).stem}"
+    spec = importlib.util.spec_from_file_location(module_name, server_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for value in vars(module).values():
+        if isinstance(value, FastMCP):
+            return value
+    raise ValueError(f"No FastMCP instance found in {server_path}")
+
+
+class InProcessMcpTool(StdioMcpToolAdapter):
+    """
+    Native tool that calls a FastMCP tool function directly, without a server process or MCP session.
+    Arguments are validated against the input schema and results and errors are formatted
+    exactly as an MCP tool adapter would return them.
+    """
+
+    def __init__(self, server_pool: "InProcessServerPool", server_path: str, tool: Tool) -> None:
+        super().__init__(server_params=server_pool.server_params(server_path), tool=tool)
+        self._server_pool = server_pool
+        self._server_path = server_path
+
+    async def run(self, args: BaseModel, cancellation_token: CancellationToken) -> Any:
+        if cancellation_token.is_cancelled():
+            raise asyncio.CancelledError("Operation cancelled")
+
+        kwargs = args.model_dump(exclude_unset=True)
+        server = self._server_pool.server(self._server_path)
+        try:
+            jsonschema.validate(instance=kwargs, schema=self._tool.inputSchema)
+        except jsonschema.ValidationError as e:
+            raise self._tool_error(f"Input validation error: {e.message}")
+
+        try:
+            with timed("tool_call"):
+                result = await server.call_tool(self._tool.name, kwargs)
+        except Exception as e:
+            raise self._tool_error(str(e))
+
+        # Same normalization as the MCP server applies before sending the result
+        if isinstance(result, tuple) and len(result) == 2:
+            result = result[0]
+        elif isinstance(result, dict):
+            result = [TextContent(type="text", text=json.dumps(result, indent=2))]
+        return self._normalize_payload_to_content_list(result)
+
+    def _tool_error(self, message: str) -> Exception:
+        return Exception(self.return_value_as_string([TextContent(type="text", text=message)]))
+
+
+class InProcessServerPool:
+    """
+    Import every sampled server module once and call its tools in the harness process.
+    Exposes the same interface as ServerPool, but no process is ever started.
+    """
+
+    def __init__(self) -> None:
+        self._servers: Dict[str, FastMCP] = {}
+        self._tools: Dict[str, List[Any]] = {}
+
+    def server_params(self, server_path: str) -> StdioServerParams:
+        return StdioServerParams(command="python", args=[server_path])
+
+    def server(self, server_path: str) -> FastMCP:
+        if server_path not in self._servers:
+            # Importing the module takes the place of starting a server
+            with timed("spawn"):
+                self._servers[server_path] = load_server_module(server_path)
+        return self._servers[server_path]
+
+    async def warm(self, server_path: str) -> None:
+        self.server(server_path)
+
+    async def tools(self, server_path: str) -> List[Any]:
+        if server_path not in self._tools:
+            server = self.server(server_path)
+            with timed("list_tools"):
+                definitions = await server.list_tools()
+            self._tools[server_path] = [InProcessMcpTool(self, server_path, tool) for tool in definitions]
+        return self._tools[server_path]
+
+    def bind_tools(self, server_path: str, tools: List[Tool]) -> List[Any]:
+        if server_path not in self._tools:
+            self._tools[server_path] = [InProcessMcpTool(self, server_path, tool) for tool in tools]
+        return self._tools[server_path]
+
+    async def close(self) -> None:
+        self._servers.clear()
+        self._tools.clear()
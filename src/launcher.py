@@ -0,0 +1,135 @@
+import asyncio
+import os
+import random
+import runpy
+import signal
+import socket
+import sys
+from contextlib import asynccontextmanager
+
+import anyio
+import mcp.types as types
+from mcp.shared.message import SessionMessage
+
+
+# Modules imported once by the launcher and inherited by every forked server
+PRELOAD_MODULES = [
+    "pydantic",
+    "anyio",
+    "starlette",
+    "mcp.server.fastmcp",
+    "mcp.server.stdio",
+]
+
+# Largest JSON-RPC line accepted from a forked server
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+def _run_server(conn: socket.socket, server_path: str) -> None:
+    """Run a server file in a forked child, with the connection as its stdin and stdout."""
+    os.dup2(conn.fileno(), 0)
+    os.dup2(conn.fileno(), 1)
+    conn.close()
+    # The child inherits the launcher's random state, so every server would roll the same numbers
+    random.seed()
+    runpy.run_path(server_path, run_name="__main__")
+
+
+def serve(socket_path: str) -> None:
+    """
+    Launcher daemon: import the MCP stack once, then fork a child for every requested server.
+    A client connects to the unix socket and sends the server file path followed by a newline;
+    the forked child then speaks MCP over that same connection, as it would over stdio.
+
+    Args:
+        socket_path: Path of the unix socket to listen on
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("The launcher requires os.fork, which is not available on this platform")
+
+    for module in PRELOAD_MODULES:
+        __import__(module)
+
+    # Forked servers are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+    print("ready", flush=True)
+
+    while True:
+        conn, _ = listener.accept()
+        request = b""
+        while not request.endswith(b"\n"):
+            chunk = conn.recv(1)
+            if not chunk:
+                break
+            request += chunk
+        server_path = request.decode("utf-8").strip()
+        if not server_path:
+            conn.close()
+            continue
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if os.fork() == 0:
+            listener.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            try:
+                _run_server(conn, server_path)
+            finally:
+                os._exit(0)
+        conn.close()
+
+
+@asynccontextmanager
+async def launcher_client(socket_path: str, server_path: str):
+    """
+    Ask the launcher for a server and expose the connection as MCP read/write streams,
+    in the same way stdio_client does for a server process.
+
+    Args:
+        socket_path: Path of the launcher socket
+        server_path: Path to the server file
+
+    Yields:
+        tuple: (read_stream, write_stream) for a ClientSession
+    """
+    reader, writer = await asyncio.open_unix_connection(socket_path, limit=MAX_LINE_BYTES)
+    writer.write((server_path + "\n").encode("utf-8"))
+    await writer.drain()
+
+    read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+
+    async def socket_reader():
+        async with read_stream_writer:
+            while line := await reader.readline():
+                try:
+                    message = types.JSONRPCMessage.model_validate_json(line)
+                except Exception as exc:
+                    await read_stream_writer.send(exc)
+                    continue
+                await read_stream_writer.send(SessionMessage(message))
+
+    async def socket_writer():
+        async with write_stream_reader:
+            async for session_message in write_stream_reader:
+                data = session_message.message.model_dump_json(by_alias=True, exclude_none=True)
+                writer.write((data + "\n").encode("utf-8"))
+                await writer.drain()
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(socket_reader)
+        tg.start_soon(socket_writer)
+        try:
+            yield read_stream, write_stream
+        finally:
+            # Closing the connection ends the server's stdin, so the child exits
+            writer.close()
+            tg.cancel_scope.cancel()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1])
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from .metrics import percentile
+
+
+# HTTP status codes that mean the provider is overloaded
+THROTTLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """Whether a model call failed because the provider throttled or is overloaded (429/5xx)."""
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in THROTTLE_STATUS_CODES or status >= 500)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limit the number of tasks in flight, adjusting the limit with AIMD from the model call feedback:
+    - After every window of completed model calls, the limit grows by one if the tasks in flight reached
+      the limit during the window and the window's p95 latency stays within latency_tolerance times the
+      lowest window p95 seen so far (the unloaded latency); a limit that was never used is not raised
+    - It is multiplied by backoff when the window p95 rises above that, or when a call fails with 429/5xx
+    - Feedback of calls started before the last decrease is ignored, they were sent under the old limit
+    Used like an asyncio.Semaphore: `async with limiter: ...`. Every decision is kept in `decisions`.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int = 1,
+        max_limit: Optional[int] = None,
+        latency_tolerance: float = 1.5,
+        backoff: float = 0.5,
+        min_window: int = 5,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit or initial_limit * 4
+        self.limit = max(min_limit, min(initial_limit, self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.min_window = min_window
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.baseline_p95: Optional[float] = None
+        self.decisions: List[Dict[str, Any]] = []
+        self._window: List[float] = []
+        self._window_peak = 0
+        self._waiters = deque()
+        self._start = time.monotonic()
+        self._last_decrease = self._start
+
+    async def __aenter__(self) -> "AdaptiveConcurrencyLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+    async def acquire(self) -> None:
+        """Wait until fewer tasks than the current limit are in flight, first come, first served."""
+        if self.in_flight >= self.limit or self._waiters:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just before the cancellation
+                    self.release()
+                elif waiter in self._waiters:
+                    # A cancelled waiter may already have been dropped by _wake
+                    self._waiters.remove(waiter)
+                raise
+        else:
+            self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        self._window_peak = max(self._window_peak, self.in_flight)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def on_success(self, latency: float, started_at: float) -> None:
+        """
+        Feed back the latency of a completed model call.
+
+        Args:
+            latency: Duration of the call in seconds
+            started_at: time.monotonic() at which the call was sent
+        """
+        if started_at < self._last_decrease:
+            return
+        self._window.append(latency)
+        if len(self._window) < max(self.min_window, self.limit):
+            return
+
+        p95 = percentile(self._window, 95)
+        saturated = self._window_peak >= self.limit
+        self._window = []
+        self._window_peak = self.in_flight
+        if self.baseline_p95 is None or p95 < self.baseline_p95:
+            self.baseline_p95 = p95
+
+        if p95 > self.baseline_p95 * self.latency_tolerance:
+            self._decrease(f"p95 latency {p95:.2f}s above {self.latency_tolerance}x baseline {self.baseline_p95:.2f}s", p95)
+        elif self.limit < self.max_limit and saturated:
+            self._set_limit(self.limit + 1, "increase", f"p95 latency {p95:.2f}s within tolerance", p95)
+
+    def on_throttle(self, error: BaseException, started_at: float) -> None:
+        """
+        Feed back a model call that failed with 429/5xx.
+
+        Args:
+            error: The error raised by the model client
+            started_at: time.monotonic() at which the call was sent
+        """
+        if started_at < self._last_decrease:
+            return
+        self._window = []
+        self._window_peak = self.in_flight
+        self._decrease(f"{type(error).__name__} (status {getattr(error, 'status_code', None)})", None)
+
+    def _decrease(self, reason: str, p95: Optional[float]) -> None:
+        self._last_decrease = time.monotonic()
+        new_limit = max(self.min_limit, int(self.limit * self.backoff))
+        if new_limit != self.limit:
+            self._set_limit(new_limit, "decrease", reason, p95)
+
+    def _set_limit(self, new_limit: int, action: str, reason: str, p95: Optional[float]) -> None:
+        decision = {
+            "time": round(time.monotonic() - self._start, 3),
+            "action": action,
+            "old_limit": self.limit,
+            "new_limit": new_limit,
+            "in_flight": self.in_flight,
+            "p95": p95,
+            "baseline_p95": self.baseline_p95,
+            "reason": reason,
+        }
+        self.decisions.append(decision)
+        print(f"Concurrency {action}: {self.limit} -> {new_limit} ({reason})")
+        self.limit = new_limit
+        self._wake()
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at rate_per_minute, holding at most one minute of tokens.
+    Callers are served in arrival order; a request larger than the bucket waits until it is full.
+    """
+
+    def __init__(self, rate_per_minute: float) -> None:
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.total_wait = 0.0
+        self._rate = rate_per_minute / 60
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """
+        Wait until amount tokens are available and take them.
+
+        Returns:
+            float: Time spent waiting, in seconds
+        """
+        amount = min(amount, self.capacity)
+        start = time.monotonic()
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self._rate)
+                self._refill()
+            self.tokens -= amount
+        wait = time.monotonic() - start
+        self.total_wait += wait
+        return wait
+
+    def adjust(self, amount: float) -> None:
+        """Take (or give back, if negative) tokens without waiting, e.g. to correct an estimate."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+from autogen_core.models import LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+
+
+# Default size bound of the response cache
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def request_key(
+    model: str,
+    messages: Sequence[LLMMessage],
+    tools: Sequence[Tool | ToolSchema],
+    tool_choice: Any,
+    json_output: Any,
+    extra_create_args: Mapping[str, Any],
+    sampling_params: Optional[Mapping[str, Any]] = None,
+) -> str:
+    """
+    Content address of a model call: SHA-256 of the model id, the full message list, the tool schemas,
+    the tool choice and output format, and the sampling parameters of the client and of the call.
+    """
+    request = {
+        "model": model,
+        "messages": [message.model_dump(mode="json") for message in messages],
+        "tools": [tool.schema if isinstance(tool, Tool) else tool for tool in tools],
+        "tool_choice": tool_choice.name if isinstance(tool_choice, Tool) else tool_choice,
+        "json_output": json_output if json_output is None or isinstance(json_output, bool) else json_output.model_json_schema(),
+        "sampling_params": dict(sampling_params or {}),
+        "extra_create_args": dict(extra_create_args),
+    }
+    encoded = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of model responses in a SQLite file, bounded in size with least-recently-used eviction.
+    Several processes may share the file, e.g. the workers of a sharded run.
+    Lookups take well under a millisecond, so they are made directly from the event loop.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached value of a key, or None; a hit makes the entry the most recently used."""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """Store a value, then evict the least recently used entries while the cache is above max_bytes."""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time()),
+                )
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_bytes:
+                    for old_key, old_size in self._db.execute(
+                        "SELECT key, size FROM responses WHERE key != ? ORDER BY last_used", (key,)
+                    ).fetchall():
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                        self.evictions += 1
+                        total -= old_size
+                        if total <= self.max_bytes:
+                            break
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, int]:
+        """Number of entries and total size in bytes of the cache."""
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": size, "evictions": self.evictions}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,64 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+
+# Metrics of the task running in the current asyncio context.
+# Tasks created while a task is running (tool calls, server startups) share its metrics.
+_task_metrics: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("task_metrics", default=None)
+
+# Phases timed for every task, in the order they are reported
+PHASES = ["spawn", "list_tools", "prompt_build", "rate_limit_wait", "llm_call", "tool_call", "reflection", "reset"]
+
+
+def start_task_metrics(metrics: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Start collecting metrics for the task running in the current context, adding to metrics if given."""
+    if metrics is None:
+        metrics = {}
+    _task_metrics.set(metrics)
+    return metrics
+
+
+def add_metric(name: str, value: float) -> None:
+    """Add value to a metric of the current task; does nothing outside a task."""
+    metrics = _task_metrics.get()
+    if metrics is not None:
+        metrics[name] = metrics.get(name, 0) + value
+
+
+def record_timing(phase: str, seconds: float) -> None:
+    """Record one duration of a phase of the current task; does nothing outside a task."""
+    metrics = _task_metrics.get()
+    if metrics is not None:
+        metrics.setdefault("timings", {}).setdefault(phase, []).append(seconds)
+
+
+@contextmanager
+def timed(phase: str):
+    """Record the duration of the enclosed block as one occurrence of a phase, also when it fails."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, time.perf_counter() - start)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Percentile of a list of values, linearly interpolated between the closest ranks.
+
+    Args:
+        values: Values, in any order
+        q: Percentile between 0 and 100
+
+    Returns:
+        float: The percentile, or 0 for an empty list
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import random
+import uuid
+from typing import Any, AsyncGenerator, Literal, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken, FunctionCall
+from autogen_core.models import (
+    AssistantMessage,
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage,
+    UserMessage,
+)
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from .utilities import load_data
+
+
+ORACLE_MODEL = "oracle"
+ORACLE_MODEL_INFO: ModelInfo = {
+    "vision": False,
+    "function_calling": True,
+    "json_output": False,
+    "family": "unknown",
+    "structured_output": False,
+}
+
+
+class OracleChatCompletionClient(ChatCompletionClient):
+    """
+    Offline model client that answers every task with its expected tool calls, to measure the throughput
+    of the harness without a provider and to check that the expected answers score 100%.
+    The task is found by the content of the user message; at step i of the task (the number of tool call
+    messages already in the conversation), the client calls the expected tools of step i with their expected
+    inputs, and after the last step it answers with a short text. Unknown tasks get a text answer.
+
+    Args:
+        tasks_path: Task file the expected tool calls are read from; the tasks of a run read from another
+            file are added with add_tasks
+        latency: Synthetic latency of every call, in seconds
+        jitter: Extra random latency of every call, uniform between 0 and jitter seconds
+        prompt_tokens: Prompt tokens reported per call; None to estimate them from the prompt length
+        completion_tokens: Completion tokens reported per call
+    """
+
+    def __init__(
+        self,
+        tasks_path: str = "data/tasks.json",
+        latency: float = 1.0,
+        jitter: float = 0.0,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: int = 50,
+    ) -> None:
+        self.tasks = {task["content"]: task for task in load_data(tasks_path)}
+        self.latency = latency
+        self.jitter = jitter
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self._total_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._actual_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def add_tasks(self, tasks: Sequence[Mapping[str, Any]]) -> None:
+        """Answer these tasks too, e.g. the tasks of a run; they replace known tasks with the same content."""
+        for task in tasks:
+            self.tasks[task["content"]] = task
+
+    def expected_answer(self, messages: Sequence[LLMMessage], tool_choice: Any) -> Union[str, list]:
+        """The expected tool calls of the current step of the task, or the final text answer."""
+        user_message = next((m for m in messages if isinstance(m, UserMessage) and isinstance(m.content, str)), None)
+        task = self.tasks.get(user_message.content) if user_message is not None else None
+        if task is None:
+            return "Oracle: unknown task, no tool calls."
+        step = sum(1 for m in messages if isinstance(m, AssistantMessage) and isinstance(m.content, list))
+        if tool_choice == "none" or step >= len(task["tools"]):
+            return f"Oracle: task {task['id']} completed."
+        return [
+            FunctionCall(id=f"call_{uuid.uuid4().hex[:24]}", name=name, arguments=json.dumps(arguments, ensure_ascii=False))
+            for name, arguments in zip(task["tools"][step], task["inputs"][step])
+        ]
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        content = self.expected_answer(messages, tool_choice)
+        usage = RequestUsage(
+            prompt_tokens=self.count_tokens(messages, tools=tools) if self.prompt_tokens is None else self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+        )
+        self._actual_usage = RequestUsage(
+            prompt_tokens=self._actual_usage.prompt_tokens + usage.prompt_tokens,
+            completion_tokens=self._actual_usage.completion_tokens + usage.completion_tokens,
+        )
+        self._total_usage = self._actual_usage
+        return CreateResult(
+            finish_reason="function_calls" if isinstance(content, list) else "stop",
+            content=content,
+            usage=usage,
+            cached=False,
+        )
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        yield await self.create(messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                                extra_create_args=extra_create_args, cancellation_token=cancellation_token)
+
+    async def close(self) -> None:
+        pass
+
+    def actual_usage(self) -> RequestUsage:
+        return self._actual_usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._total_usage
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        # ~4 characters per token
+        schemas = [tool.schema if isinstance(tool, Tool) else tool for tool in tools]
+        return (sum(len(str(message.content)) for message in messages) + len(json.dumps(schemas, default=str))) // 4
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return max(0, 128000 - self.count_tokens(messages, tools=tools))
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return ORACLE_MODEL_INFO  # type: ignore
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return ORACLE_MODEL_INFO
@@ -0,0 +1,102 @@
+import heapq
+import os
+import statistics
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .utilities import flatten, load_data
+
+
+LOGS_DIR = "logs"
+
+
+def task_shape(task: Dict[str, Any]) -> tuple:
+    """(number of expected tool calls, number of sequential steps) of a task."""
+    return len(list(flatten(task["tools"]))), len(task["tools"])
+
+
+def load_task_history(logs_dir: str = LOGS_DIR, model: Optional[str] = None) -> Dict[str, float]:
+    """
+    Read the time every task took in earlier runs from the response logs.
+
+    Args:
+        logs_dir: Directory of the response logs
+        model: If given and the model has earlier logs, only those are used
+
+    Returns:
+        dict: Median task_time of every task that completed without error, keyed by task id
+    """
+    log_paths = sorted(str(p) for p in Path(logs_dir).glob("*_response_*.json")) if os.path.isdir(logs_dir) else []
+    if model is not None:
+        prefix = model.replace("/", "_") + "_response_"
+        model_logs = [p for p in log_paths if os.path.basename(p).startswith(prefix)]
+        log_paths = model_logs or log_paths
+
+    times: Dict[str, List[float]] = {}
+    for log_path in log_paths:
+        try:
+            responses = load_data(log_path)
+        except Exception as e:
+            print(f"Warning: Skipping unreadable log {log_path}: {e}")
+            continue
+        if not isinstance(responses, list):
+            continue
+        for response in responses:
+            if isinstance(response, dict) and "error" not in response and response.get("task_time"):
+                times.setdefault(response.get("task_id"), []).append(response["task_time"])
+    return {task_id: statistics.median(values) for task_id, values in times.items()}
+
+
+def estimate_task_costs(tasks: List[Dict[str, Any]], history: Dict[str, float]) -> List[float]:
+    """
+    Estimate the duration of every task, from the most to the least specific source:
+    its own historical time, the mean historical time of tasks with the same number of tool calls and steps,
+    the mean historical time per tool call times its number of tool calls, or, without any history,
+    its number of tool calls plus steps as a relative cost.
+
+    Args:
+        tasks: Tasks to estimate
+        history: Historical task times keyed by task id, see load_task_history
+
+    Returns:
+        list: Estimated cost of every task, in seconds when there is history
+    """
+    by_shape: Dict[tuple, List[float]] = {}
+    per_tool: List[float] = []
+    for task in tasks:
+        if task["id"] in history:
+            num_tools, steps = task_shape(task)
+            by_shape.setdefault((num_tools, steps), []).append(history[task["id"]])
+            per_tool.append(history[task["id"]] / max(num_tools, 1))
+
+    costs = []
+    for task in tasks:
+        num_tools, steps = task_shape(task)
+        if task["id"] in history:
+            costs.append(history[task["id"]])
+        elif (num_tools, steps) in by_shape:
+            costs.append(statistics.mean(by_shape[(num_tools, steps)]))
+        elif per_tool:
+            costs.append(statistics.mean(per_tool) * num_tools)
+        else:
+            costs.append(float(num_tools + steps))
+    return costs
+
+
+def estimate_makespan(costs: List[float], concurrency: int) -> float:
+    """
+    Makespan of running tasks with the given costs in list order on concurrency slots,
+    each task starting on the first slot that becomes free.
+    """
+    slots = [0.0] * max(1, min(concurrency, len(costs)))
+    for cost in costs:
+        heapq.heappush(slots, heapq.heappop(slots) + cost)
+    return max(slots)
+
+
+def schedule_tasks(tasks: List[Dict[str, Any]], costs: List[float]) -> List[int]:
+    """
+    Longest-expected-job-first order: task indexes sorted by decreasing estimated cost,
+    ties kept in file order.
+    """
+    return sorted(range(len(tasks)), key=lambda index: -costs[index])
@@ -0,0 +1,444 @@
+import asyncio
+import math
+import os
+import shutil
+import tempfile
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+import anyio
+from autogen_core import CancellationToken
+from autogen_ext.tools.mcp import StdioMcpToolAdapter, StdioServerParams, create_mcp_server_session
+from mcp import ClientSession, Tool
+from mcp.shared.memory import create_client_server_memory_streams
+from pydantic import BaseModel
+
+from .inprocess import InProcessServerPool, load_server_module
+from .launcher import launcher_client
+from .metrics import add_metric, record_timing, timed
+
+
+class ProcessBudget:
+    """
+    Harness-wide limit on the number of live server processes, shared by all server pools.
+    Waiting spawns are served first come, first served. When a spawn has to wait,
+    the pools are asked to stop one of their idle servers to make room.
+    """
+
+    def __init__(self, max_processes: Optional[int] = None) -> None:
+        self.max_processes = max_processes
+        self.live = 0
+        self.peak_live = 0
+        self.spawns = 0
+        self.total_wait = 0.0
+        self._waiters = deque()
+        self._pools: List["ServerPool"] = []
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def register(self, pool: "ServerPool") -> None:
+        self._pools.append(pool)
+
+    def unregister(self, pool: "ServerPool") -> None:
+        if pool in self._pools:
+            self._pools.remove(pool)
+
+    def reclaim(self) -> None:
+        """Ask the pools to stop one idle server, its slot then goes to the next waiting spawn."""
+        for pool in self._pools:
+            if pool.evict_idle():
+                return
+
+    async def acquire(self) -> float:
+        """
+        Wait for a free process slot.
+
+        Returns:
+            float: Time spent waiting in the queue, in seconds
+        """
+        start = time.monotonic()
+        if self.max_processes is not None and (self.live >= self.max_processes or self._waiters):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self.reclaim()
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just before the cancellation
+                    self.release()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                raise
+        else:
+            self.live += 1
+        self.spawns += 1
+        self.peak_live = max(self.peak_live, self.live)
+        wait = time.monotonic() - start
+        self.total_wait += wait
+        return wait
+
+    def release(self) -> None:
+        """Free a process slot, handing it directly to the longest waiting spawn if there is one."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.live -= 1
+
+
+class PooledMcpToolAdapter(StdioMcpToolAdapter):
+    """
+    MCP tool adapter built from a known tool definition.
+    The server is only started, through the pool, when the tool is first called.
+    """
+
+    def __init__(self, server_pool: "ServerPool", server_path: str, tool: Tool) -> None:
+        super().__init__(server_params=server_pool.server_params(server_path), tool=tool)
+        self._server_pool = server_pool
+        self._server_path = server_path
+
+    async def run(self, args: BaseModel, cancellation_token: CancellationToken) -> Any:
+        kwargs = args.model_dump(exclude_unset=True)
+        async with self._server_pool.use(self._server_path) as session:
+            with timed("tool_call"):
+                return await self._run(args=kwargs, cancellation_token=cancellation_token, session=session)
+
+
+class ServerPool:
+    """
+    Keep one warm MCP server per server file for the whole run:
+    - A server is started the first time any agent samples it
+    - Its session stays open and is shared by every agent that samples it afterwards
+    - With a process budget, idle servers are stopped when other servers wait for a slot
+    - A server must start within start_timeout_seconds of getting its process slot; the time spent
+      waiting for the slot does not count
+    - close() shuts every server down at the end of the run
+    """
+
+    # Whether each server of this pool runs as its own process and counts against the budget
+    spawns_processes = True
+
+    def __init__(self, command: str = "python", budget: Optional[ProcessBudget] = None, read_timeout_seconds: float = 30, start_timeout_seconds: float = 30) -> None:
+        self._command = command
+        self._read_timeout_seconds = read_timeout_seconds
+        self._start_timeout_seconds = start_timeout_seconds
+        self._servers: Dict[str, Dict[str, Any]] = {}
+        self._bound_tools: Dict[str, List[Any]] = {}
+        self._stopping: List[asyncio.Task] = []
+        self._budget = budget if self.spawns_processes else None
+        if self._budget is not None:
+            self._budget.register(self)
+
+    def server_params(self, server_path: str) -> StdioServerParams:
+        # Servers of several agents may initialize at the same time, which can exceed the default 5 s
+        return StdioServerParams(
+            command=self._command,
+            args=[server_path],
+            read_timeout_seconds=self._read_timeout_seconds,
+        )
+
+    def _open_session(self, server_path: str):
+        return create_mcp_server_session(self.server_params(server_path))
+
+    async def _serve(self, server_path: str, entry: Dict[str, Any]) -> None:
+        """
+        Hold the session of a single server open until the pool is closed.
+        The session lives in its own task so that it is entered and exited from the same task.
+        """
+        ready = entry["ready"]
+        acquired = False
+        try:
+            if self._budget is not None:
+                add_metric("spawn_wait_time", await self._budget.acquire())
+                acquired = True
+            entry["queued"] = False
+            spawn_start = time.perf_counter()
+            # The start timeout runs from here, so that waiting for a process slot does not count
+            with anyio.fail_after(self._start_timeout_seconds) as start_scope:
+                async with self._open_session(server_path) as session:
+                    await session.initialize()
+                    start_scope.deadline = math.inf
+                    record_timing("spawn", time.perf_counter() - spawn_start)
+                    ready.set_result(session)
+                    if entry["requesters"] == 0 and self._budget is not None and self._budget.waiting:
+                        # Everyone who asked for this server has given up, so it is idle from the start
+                        self._budget.reclaim()
+                    await entry["stop"].wait()
+        except BaseException as e:
+            if not ready.done():
+                if isinstance(e, asyncio.CancelledError):
+                    ready.cancel()
+                else:
+                    ready.set_exception(e)
+            elif not isinstance(e, asyncio.CancelledError):
+                print(f"Warning: Server {server_path} stopped unexpectedly: {e}")
+        finally:
+            if acquired:
+                self._budget.release()
+
+    async def _ready_entry(self, server_path: str):
+        """
+        Get the pool entry of a server once it is running, starting the server if needed.
+        If every caller waiting for a server that has not got a process slot yet is cancelled,
+        the server is not started at all, so it cannot hold a slot that nobody will use.
+
+        Returns:
+            tuple: The entry and its initialized session
+        """
+        entry = self._servers.get(server_path)
+        if entry is None:
+            entry = {
+                "ready": asyncio.get_running_loop().create_future(),
+                "stop": asyncio.Event(),
+                "active": 0,
+                "requesters": 0,
+                "queued": True,
+                "last_used": time.monotonic(),
+            }
+            entry["task"] = asyncio.create_task(self._serve(server_path, entry))
+            self._servers[server_path] = entry
+
+        entry["requesters"] += 1
+        try:
+            session = await asyncio.shield(entry["ready"])
+        except asyncio.CancelledError:
+            entry["requesters"] -= 1
+            if entry["requesters"] == 0 and self._servers.get(server_path) is entry:
+                if entry["queued"]:
+                    del self._servers[server_path]
+                    entry["task"].cancel()
+                    self._stopping.append(entry["task"])
+                elif entry["ready"].done() and self._budget is not None and self._budget.waiting:
+                    self._budget.reclaim()
+            raise
+        except Exception:
+            entry["requesters"] -= 1
+            # Forget the failed server so that the next agent sampling it tries again
+            if self._servers.get(server_path) is entry:
+                del self._servers[server_path]
+            raise
+        entry["requesters"] -= 1
+        return entry, session
+
+    async def session(self, server_path: str):
+        """
+        Get the live session of a server, starting the server if it is not running yet.
+
+        Args:
+            server_path: Path to the server file
+
+        Returns:
+            ClientSession: The initialized session
+        """
+        _, session = await self._ready_entry(server_path)
+        return session
+
+    async def warm(self, server_path: str) -> None:
+        """Start a server ahead of its first tool call."""
+        await self.session(server_path)
+
+    @asynccontextmanager
+    async def use(self, server_path: str):
+        """
+        Get the live session of a server for one call, so that it is not stopped while the call runs.
+
+        Args:
+            server_path: Path to the server file
+
+        Yields:
+            ClientSession: The initialized session
+        """
+        entry, session = await self._ready_entry(server_path)
+        entry["active"] += 1
+        try:
+            yield session
+        finally:
+            entry["active"] -= 1
+            entry["last_used"] = time.monotonic()
+            if self._budget is not None and self._budget.waiting:
+                self._budget.reclaim()
+
+    def evict_idle(self) -> bool:
+        """
+        Stop the least recently used server that is running and has no call in progress.
+
+        Returns:
+            bool: Whether a server was stopped
+        """
+        idle = [
+            (entry["last_used"], server_path)
+            for server_path, entry in self._servers.items()
+            if entry["active"] == 0 and entry["requesters"] == 0 and entry["ready"].done()
+            and not entry["ready"].cancelled() and not entry["ready"].exception()
+        ]
+        if not idle:
+            return False
+        _, server_path = min(idle)
+        entry = self._servers.pop(server_path)
+        entry["stop"].set()
+        self._stopping.append(entry["task"])
+        return True
+
+    async def tools(self, server_path: str) -> List[Any]:
+        """
+        Get the tool adapters of a server, listing its tools from the running server.
+
+        Args:
+            server_path: Path to the server file
+
+        Returns:
+            list: Tool adapters of the server
+        """
+        if server_path not in self._bound_tools:
+            async with self.use(server_path) as session:
+                with timed("list_tools"):
+                    result = await session.list_tools()
+            self.bind_tools(server_path, result.tools)
+        return self._bound_tools[server_path]
+
+    def bind_tools(self, server_path: str, tools: List[Tool]) -> List[Any]:
+        """
+        Get tool adapters of a server from known tool definitions without starting it.
+
+        Args:
+            server_path: Path to the server file
+            tools: MCP tool definitions of the server, e.g. from the tool catalog
+
+        Returns:
+            list: Tool adapters that start the server on their first call
+        """
+        if server_path not in self._bound_tools:
+            self._bound_tools[server_path] = [PooledMcpToolAdapter(self, server_path, tool) for tool in tools]
+        return self._bound_tools[server_path]
+
+    async def close(self) -> None:
+        """Shut down every server started by the pool."""
+        if self._budget is not None:
+            self._budget.unregister(self)
+        entries = list(self._servers.values())
+        self._servers.clear()
+        for entry in entries:
+            entry["stop"].set()
+        tasks = [entry["task"] for entry in entries] + self._stopping
+        self._stopping = []
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class InMemoryServerPool(ServerPool):
+    """
+    Host every sampled FastMCP server inside the harness process.
+    Each server is connected to its client session over in-memory streams, so the full
+    MCP initialize/list_tools/call_tool exchange still takes place, but no process is started.
+    """
+
+    spawns_processes = False
+
+    @asynccontextmanager
+    async def _open_session(self, server_path: str):
+        server = load_server_module(server_path)._mcp_server
+        read_timeout = timedelta(seconds=self.server_params(server_path).read_timeout_seconds)
+        async with create_client_server_memory_streams() as (client_streams, server_streams):
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(
+                    lambda: server.run(
+                        server_streams[0],
+                        server_streams[1],
+                        server.create_initialization_options(),
+                    )
+                )
+                try:
+                    async with ClientSession(
+                        read_stream=client_streams[0],
+                        write_stream=client_streams[1],
+                        read_timeout_seconds=read_timeout,
+                    ) as session:
+                        yield session
+                finally:
+                    tg.cancel_scope.cancel()
+
+
+class ForkServerPool(ServerPool):
+    """
+    Start servers by forking them from a launcher daemon that has already imported the MCP stack.
+    Every server still runs in its own process, but skips the interpreter start and the imports.
+    The launcher is started with the first server and stopped by close().
+    """
+
+    def __init__(self, command: str = "python", budget: Optional[ProcessBudget] = None, read_timeout_seconds: float = 30, start_timeout_seconds: float = 30) -> None:
+        super().__init__(command, budget, read_timeout_seconds, start_timeout_seconds)
+        self._launcher = None
+        self._launcher_lock = asyncio.Lock()
+        self._socket_dir = None
+        self._socket_path = None
+
+    async def _start_launcher(self) -> str:
+        async with self._launcher_lock:
+            if self._launcher is None:
+                if not hasattr(os, "fork"):
+                    raise RuntimeError("The forkserver backend requires os.fork, which is not available on this platform")
+                self._socket_dir = tempfile.mkdtemp(prefix="mcp_launcher_")
+                self._socket_path = os.path.join(self._socket_dir, "launcher.sock")
+                launcher_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "launcher.py")
+                self._launcher = await asyncio.create_subprocess_exec(
+                    self._command, launcher_script, self._socket_path,
+                    stdout=asyncio.subprocess.PIPE,
+                )
+                ready = await self._launcher.stdout.readline()
+                if ready.strip() != b"ready":
+                    raise RuntimeError("Server launcher failed to start")
+        return self._socket_path
+
+    @asynccontextmanager
+    async def _open_session(self, server_path: str):
+        socket_path = await self._start_launcher()
+        read_timeout = timedelta(seconds=self.server_params(server_path).read_timeout_seconds)
+        async with launcher_client(socket_path, server_path) as (read_stream, write_stream):
+            async with ClientSession(
+                read_stream=read_stream,
+                write_stream=write_stream,
+                read_timeout_seconds=read_timeout,
+            ) as session:
+                yield session
+
+    async def close(self) -> None:
+        await super().close()
+        if self._launcher is not None:
+            if self._launcher.returncode is None:
+                self._launcher.terminate()
+            await self._launcher.wait()
+            self._launcher = None
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+
+def create_server_pool(backend: str = "stdio", budget: Optional[ProcessBudget] = None):
+    """
+    Create the server pool of a run.
+
+    Args:
+        backend: "stdio" runs every server as its own process,
+            "forkserver" forks every server process from a launcher with the MCP stack pre-imported,
+            "inmemory" hosts the servers in the harness process and talks MCP to them over in-memory streams,
+            "inprocess" imports the server modules and calls their tool functions directly
+        budget: Process budget shared with the other pools of the run
+
+    Returns:
+        ServerPool | ForkServerPool | InMemoryServerPool | InProcessServerPool: The server pool
+    """
+    if backend == "stdio":
+        return ServerPool(budget=budget)
+    if backend == "forkserver":
+        return ForkServerPool(budget=budget)
+    if backend == "inmemory":
+        return InMemoryServerPool()
+    if backend == "inprocess":
+        return InProcessServerPool()
+    raise ValueError(f"Unknown server backend: {backend}")
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from .agenttest import generate_responses_multi, run_options
+from .catalog import build_tool_catalog
+from .utilities import configure_logging, load_data, load_jsonl, save_data, save_ordered_view
+
+
+def shard_of(task_id, num_shards):
+    """Shard of a task; depends only on the task id, so a task lands in the same shard on every run."""
+    return zlib.crc32(task_id.encode("utf-8")) % num_shards
+
+
+def _run_shard(models, tasks_path, output_paths, concurrency, num_servers, options, resume_from):
+    """Entry point of a worker process: run one shard of the tasks in its own event loop."""
+    # Spawned workers start with unconfigured logging, set it up as in the parent
+    configure_logging()
+    return asyncio.run(generate_responses_multi(models, tasks_path, output_paths, concurrency, num_servers, options, resume_from))
+
+
+def merge_shard_logs(tasks, shard_logs, output_path):
+    """
+    Merge the JSONL logs of the shards of a run into one log, in the same format as an unsharded run:
+    output_path gets the responses ordered by task, with a .jsonl stream next to it.
+
+    Args:
+        tasks: All tasks of the run
+        shard_logs: JSONL logs of the shards
+        output_path: Path of the merged log
+
+    Returns:
+        int: Number of tasks with a response in the merged log
+    """
+    task_indexes = {task["id"]: index for index, task in enumerate(tasks)}
+    jsonl_path = os.path.splitext(output_path)[0] + ".jsonl"
+    answered = set()
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for shard_log in shard_logs:
+            for response in load_jsonl(shard_log):
+                task_id = response.get("task_id")
+                if task_id not in task_indexes or task_id in answered:
+                    continue
+                # Shards number their tasks from 1, the merged log uses the index in the full task list
+                response["task_index"] = task_indexes[task_id] + 1
+                f.write(json.dumps(response, ensure_ascii=False) + "\n")
+                answered.add(task_id)
+    save_ordered_view(jsonl_path, output_path)
+    return len(answered)
+
+
+def merge_shard_decisions(shard_paths, output_path):
+    """
+    Collect the adaptive concurrency decisions saved next to the shard logs of a run into one file next to
+    output_path, {"shards": [...]} with the shard index in every entry; nothing is written without any.
+
+    Returns:
+        str: Path of the merged decisions, or None
+    """
+    shard_decisions = []
+    for shard_index, shard_path in enumerate(shard_paths):
+        decisions_path = os.path.splitext(shard_path)[0] + "_concurrency.json"
+        if os.path.exists(decisions_path):
+            shard_decisions.append(dict(load_data(decisions_path), shard=shard_index))
+    if not shard_decisions:
+        return None
+    decisions_path = os.path.splitext(output_path)[0] + "_concurrency.json"
+    save_data(decisions_path, {"shards": shard_decisions})
+    return decisions_path
+
+
+async def generate_responses_sharded(models, tasks_path, output_paths, concurrency, num_servers, num_workers, options=None, resume_from=None, **overrides):
+    """
+    Process all tasks in num_workers processes, each running a shard of the tasks with its own event loop,
+    model clients and server pool, then merge the shard logs into one log per model.
+    Tasks are assigned to shards by a hash of their id. The concurrency, the server process limit and the
+    requests_per_minute/tokens_per_minute quotas of the models are split between the workers, so together
+    they send no more than a single process would. The adaptive concurrency decisions of the workers are
+    kept in one file next to each merged log.
+
+    Args:
+        models: Model names to use
+        tasks_path: Path to tasks JSON file
+        output_paths: Output path for saving the responses of each model, keyed by model
+        concurrency: Number of tasks processed simultaneously per model, across all workers
+        num_servers: Number of servers required for agent construction
+        num_workers: Number of worker processes
+        options: Run options, see run_options; max_server_processes and quota_share apply across all workers
+        resume_from: Log of an interrupted run to resume, keyed by model
+        overrides: Run options given as keyword arguments
+
+    Returns:
+        dict: Output file path of every model whose responses are complete
+    """
+    options = run_options(options, **overrides)
+    tasks = load_data(tasks_path)
+    shards = [[] for _ in range(num_workers)]
+    for task in tasks:
+        shards[shard_of(task["id"], num_workers)].append(task)
+    shards = [shard for shard in shards if shard]
+
+    # The catalog is refreshed once here; the workers only read it
+    if options["use_catalog"]:
+        await build_tool_catalog()
+
+    shard_dir = tempfile.mkdtemp(prefix="shards_", dir=os.path.dirname(output_paths[models[0]]) or ".")
+    worker_concurrency = max(1, math.ceil(concurrency / len(shards)))
+    worker_options = dict(options)
+    if options["max_server_processes"] is not None:
+        worker_options["max_server_processes"] = max(1, options["max_server_processes"] // len(shards))
+    # Every worker creates its own rate limited clients, so each gets its share of the quotas
+    worker_options["quota_share"] = options["quota_share"] / len(shards)
+
+    print(f"Running {len(tasks)} tasks in {len(shards)} worker processes "
+          f"(shard sizes: {[len(shard) for shard in shards]}, concurrency {worker_concurrency} per worker)")
+
+    shard_outputs = []
+    jobs = []
+    # Workers are spawned rather than forked, so they do not inherit the running event loop
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context("spawn")) as executor:
+        loop = asyncio.get_running_loop()
+        for shard_index, shard in enumerate(shards):
+            shard_tasks_path = os.path.join(shard_dir, f"tasks_{shard_index}.json")
+            save_data(shard_tasks_path, shard)
+            shard_paths = {
+                model: os.path.join(shard_dir, f"{shard_index}_{os.path.basename(output_paths[model])}")
+                for model in models
+            }
+            shard_outputs.append(shard_paths)
+            jobs.append(loop.run_in_executor(
+                executor, _run_shard, models, shard_tasks_path, shard_paths, worker_concurrency, num_servers, worker_options, resume_from
+            ))
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+
+    for shard_index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            print(f"✗ Worker {shard_index} failed: {type(result).__name__}: {result}")
+
+    completed = {}
+    failed = False
+    for model in models:
+        # Logs of failed shards are merged too, so that the merged log can be resumed
+        shard_logs = [os.path.splitext(paths[model])[0] + ".jsonl" for paths in shard_outputs]
+        shard_logs = [shard_log for shard_log in shard_logs if os.path.exists(shard_log)]
+        num_answered = merge_shard_logs(tasks, shard_logs, output_paths[model])
+        merge_shard_decisions([paths[model] for paths in shard_outputs], output_paths[model])
+        if num_answered == len(tasks):
+            completed[model] = output_paths[model]
+        else:
+            failed = True
+            print(f"✗ Only {num_answered} of {len(tasks)} tasks answered for model {model}; "
+                  f"run again with resume_from={os.path.splitext(output_paths[model])[0]}.jsonl")
+
+    # Shard files are kept for inspection when a shard did not complete
+    if not failed:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    return completed
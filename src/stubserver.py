@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from .utilities import load_data
+
+
+DEFAULT_PORT = 8000
+
+
+def oracle_scripts(tasks: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Scripts answering every task with its expected tool calls, keyed by task content.
+    A script is the list of assistant turns of a task: one turn per step of tool calls, then a final text turn.
+    """
+    scripts = {}
+    for task in tasks:
+        turns = [
+            {"content": None, "tool_calls": [(name, json.dumps(arguments, ensure_ascii=False)) for name, arguments in zip(tools, inputs)], "usage": None}
+            for tools, inputs in zip(task["tools"], task["inputs"])
+        ]
+        turns.append({"content": f"Oracle: task {task['id']} completed.", "tool_calls": [], "usage": None})
+        scripts[task["content"]] = turns
+    return scripts
+
+
+def replay_scripts(log_paths: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Scripts replaying the assistant turns recorded in response logs, with their recorded token usage,
+    keyed by task content. The first log answering a task without error is used.
+    """
+    scripts = {}
+    for log_path in log_paths:
+        for response in load_data(log_path):
+            if "error" in response or response.get("task_content") in scripts:
+                continue
+            turns = []
+            thought = None
+            for message in response.get("inner_messages", []):
+                if message.get("type") == "ThoughtEvent":
+                    thought = message.get("content")
+                elif message.get("type") == "ToolCallRequestEvent":
+                    turns.append({
+                        "content": thought,
+                        "tool_calls": [(call["name"], call["arguments"]) for call in message["content"]],
+                        "usage": message.get("models_usage"),
+                    })
+                    thought = None
+            chat_message = response.get("chat_message") or {}
+            final_text = chat_message.get("content") if isinstance(chat_message.get("content"), str) else "Done."
+            turns.append({"content": final_text, "tool_calls": [], "usage": chat_message.get("models_usage")})
+            scripts[response["task_content"]] = turns
+    return scripts
+
+
+class StubModelServer:
+    """
+    Local OpenAI-compatible chat completions endpoint (/v1/chat/completions) answering the benchmark tasks
+    from scripts, to load-test the harness end to end (HTTP, connection pooling, JSON decoding, retries,
+    concurrency control) without a provider. The task is found by the content of the first user message,
+    and the turn of its script by the number of assistant tool call messages in the conversation;
+    a request with tool_choice "none" (reflection) gets the final text turn.
+
+    Faults are injected per request:
+    - latency seconds, plus uniform jitter, plus latency_per_request for every other request in flight
+    - 429 with a Retry-After header: with probability throttle_rate, or when more than max_concurrent
+      requests are in flight
+    - 503 with probability error_rate
+    Counts of requests, throttles and errors, and the peak number of requests in flight are served at /stats.
+    """
+
+    def __init__(
+        self,
+        scripts: Dict[str, List[Dict[str, Any]]],
+        latency: float = 0.5,
+        jitter: float = 0.0,
+        latency_per_request: float = 0.0,
+        throttle_rate: float = 0.0,
+        max_concurrent: Optional[int] = None,
+        retry_after: float = 1.0,
+        error_rate: float = 0.0,
+    ) -> None:
+        self.scripts = scripts
+        self.latency = latency
+        self.jitter = jitter
+        self.latency_per_request = latency_per_request
+        self.throttle_rate = throttle_rate
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "unknown_tasks": 0, "in_flight": 0, "peak_in_flight": 0}
+        self.app = Starlette(routes=[
+            Route("/v1/chat/completions", self.chat_completions, methods=["POST"]),
+            Route("/v1/models", self.models, methods=["GET"]),
+            Route("/stats", self.get_stats, methods=["GET"]),
+        ])
+
+    async def models(self, request: Request) -> JSONResponse:
+        return JSONResponse({"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "mcpbench"}]})
+
+    async def get_stats(self, request: Request) -> JSONResponse:
+        return JSONResponse(self.stats)
+
+    async def chat_completions(self, request: Request):
+        body = await request.json()
+        self.stats["requests"] += 1
+        self.stats["in_flight"] += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+        try:
+            if (self.max_concurrent is not None and self.stats["in_flight"] > self.max_concurrent) or random.random() < self.throttle_rate:
+                self.stats["throttled"] += 1
+                return JSONResponse(
+                    {"error": {"message": "Rate limit exceeded (stub server)", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+                    status_code=429,
+                    headers={"retry-after": str(self.retry_after)},
+                )
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter) + self.latency_per_request * (self.stats["in_flight"] - 1))
+            if random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return JSONResponse({"error": {"message": "Service unavailable (stub server)", "type": "server_error"}}, status_code=503)
+        finally:
+            self.stats["in_flight"] -= 1
+
+        turn = self.next_turn(body)
+        usage = turn["usage"] or self.estimate_usage(body, turn)
+        usage = {"prompt_tokens": usage["prompt_tokens"], "completion_tokens": usage["completion_tokens"],
+                 "total_tokens": usage["prompt_tokens"] + usage["completion_tokens"]}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        tool_calls = [
+            {"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function", "function": {"name": name, "arguments": arguments}}
+            for name, arguments in turn["tool_calls"]
+        ]
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        model = body.get("model", "stub")
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(
+                self.stream_chunks(completion_id, model, turn["content"], tool_calls, finish_reason, usage if include_usage else None),
+                media_type="text/event-stream",
+            )
+
+        message = {"role": "assistant", "content": turn["content"]}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+            "usage": usage,
+        })
+
+    def next_turn(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        messages = body.get("messages", [])
+        user_content = next((m.get("content") for m in messages if m.get("role") == "user"), None)
+        if isinstance(user_content, list):
+            user_content = "".join(part.get("text", "") for part in user_content if isinstance(part, dict))
+        script = self.scripts.get(user_content)
+        if script is None:
+            self.stats["unknown_tasks"] += 1
+            return {"content": "Stub server: unknown task, no tool calls.", "tool_calls": [], "usage": None}
+        step = sum(1 for m in messages if m.get("role") == "assistant" and m.get("tool_calls"))
+        if body.get("tool_choice") == "none" or step >= len(script) - 1:
+            return script[-1]
+        return script[step]
+
+    @staticmethod
+    def estimate_usage(body: Dict[str, Any], turn: Dict[str, Any]) -> Dict[str, int]:
+        # ~4 characters per token
+        prompt = len(json.dumps(body.get("messages", []))) + len(json.dumps(body.get("tools", [])))
+        completion = len(turn["content"] or "") + sum(len(name) + len(arguments) for name, arguments in turn["tool_calls"])
+        return {"prompt_tokens": prompt // 4, "completion_tokens": completion // 4 + 1}
+
+    @staticmethod
+    async def stream_chunks(completion_id, model, content, tool_calls, finish_reason, usage):
+        def chunk(delta, finish=None, chunk_usage=None):
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish, "logprobs": None}],
+            }
+            if chunk_usage:
+                data["usage"] = chunk_usage
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        if content:
+            # A few chunks per answer, like a provider streaming tokens
+            for start in range(0, len(content), 64):
+                yield chunk({"content": content[start:start + 64]})
+        for index, tool_call in enumerate(tool_calls):
+            yield chunk({"tool_calls": [dict(tool_call, index=index)]})
+        yield chunk({}, finish_reason)
+        if usage:
+            yield chunk({}, chunk_usage=usage)
+        yield "data: [DONE]\n\n"
+
+
+def main():
+    """
+    Command line entry point, e.g. an oracle with 0.5-1 s latency that throttles above 20 requests in flight:
+        python -m src.stubserver --latency 0.5 --jitter 0.5 --max-concurrent 20
+    or replaying the answers recorded in a log:
+        python -m src.stubserver --replay logs/openai_gpt-5_response_general_test_20251104_154318.json
+    The harness then uses it like a provider, with any API key (e.g. API_KEY=stub) and an entry such as
+        {"model": "stub", "base_url": "http://127.0.0.1:8000/v1", "temperature": 0,
+         "model_info": {"vision": false, "function_calling": true, "json_output": false, "family": "unknown", "structured_output": false}}
+    in configs/config.json.
+    """
+    parser = argparse.ArgumentParser(description="Serve an OpenAI-compatible stub model for offline load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--tasks", default="data/tasks.json", help="Tasks answered by the oracle")
+    parser.add_argument("--replay", nargs="+", default=[], help="Response logs to replay; other tasks are answered by the oracle")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--latency-per-request", type=float, default=0.0, help="Extra latency per other request in flight")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Probability of a 429")
+    parser.add_argument("--max-concurrent", type=int, default=None, help="Answer 429 above this many requests in flight")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 503")
+    args = parser.parse_args()
+
+    scripts = oracle_scripts(load_data(args.tasks))
+    scripts.update(replay_scripts(args.replay))
+    server = StubModelServer(
+        scripts,
+        latency=args.latency,
+        jitter=args.jitter,
+        latency_per_request=args.latency_per_request,
+        throttle_rate=args.throttle_rate,
+        max_concurrent=args.max_concurrent,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+    )
+    print(f"Stub model server on http://{args.host}:{args.port}/v1 answering {len(scripts)} tasks "
+          f"({len(args.replay)} replayed logs)")
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
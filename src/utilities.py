@@ -1,14 +1,46 @@
 import json
-from typing import List, Dict, Any, Set
+import logging
+import os
+import asyncio
+from typing import List, Dict, Any, Set, Callable, Awaitable
 from datetime import datetime
 
+from .metrics import PHASES, percentile
+
+
+def configure_logging(level: int = logging.WARNING) -> None:
+    """
+    Configure the logging of a harness process: records of level and above on stderr.
+    Called by the parent process and by every worker process, so that they all print the same output.
+    It has to run before a server module is imported into the process (inprocess and inmemory backends):
+    FastMCP otherwise sets the root logger to INFO, which prints every autogen event, e.g. each tool call.
+    Logging already configured by the caller is left unchanged.
+    """
+    logging.basicConfig(level=level, format="%(levelname)s %(name)s: %(message)s")
+
 
 def load_data(file_path: str) -> List[Dict[str, Any]]:
-    """Load data from JSON file."""
+    """Load data from JSON file, or the records of a JSONL file (.jsonl) in file order."""
+    if file_path.endswith('.jsonl'):
+        return load_jsonl(file_path)
     with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 
+def load_jsonl(file_path: str) -> List[Dict[str, Any]]:
+    """Load the records of a JSONL file; a truncated last line (e.g. after a crash) is skipped."""
+    records = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Warning: Skipping unreadable line {line_number} of {file_path}")
+    return records
+
+
 def save_data(file_path: str, data) -> None:
     """Save data to JSON file."""
     with open(file_path, 'w', encoding='utf-8') as f:
@@ -16,6 +48,76 @@ def save_data(file_path: str, data) -> None:
         print (f"Data saved to {file_path}!")
 
 
+class JsonlWriter:
+    """
+    Append records to a JSONL file, one line per record, from a single writer task.
+    Every line is flushed and fsync'd before write() returns, so finished records survive a crash.
+    Use as `async with JsonlWriter(path) as writer: await writer.write(record)`.
+    """
+
+    def __init__(self, file_path: str, append: bool = False) -> None:
+        self.file_path = file_path
+        self._mode = 'a' if append else 'w'
+        self._file = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+
+    async def __aenter__(self) -> "JsonlWriter":
+        self._file = open(self.file_path, self._mode, encoding='utf-8')
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._queue.put((None, None))
+        await self._task
+        self._file.close()
+
+    async def write(self, record: Dict[str, Any]) -> None:
+        """Write one record and wait until it is on disk."""
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put((json.dumps(record, ensure_ascii=False), done))
+        await done
+
+    async def _run(self) -> None:
+        while True:
+            line, done = await self._queue.get()
+            if line is None:
+                return
+            try:
+                await asyncio.to_thread(self._append, line)
+                done.set_result(None)
+            except Exception as e:
+                done.set_exception(e)
+
+    def _append(self, line: str) -> None:
+        self._file.write(line + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+def save_ordered_view(jsonl_path: str, output_path: str, key: str = 'task_index') -> int:
+    """
+    Write the records of a JSONL file as one JSON list ordered by key.
+    Only the key of each record is parsed, the records themselves are copied as text.
+    Returns the number of records.
+    """
+    lines = []
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                lines.append((json.loads(line)[key], line))
+            except (json.JSONDecodeError, KeyError):
+                print(f"Warning: Skipping unreadable record in {jsonl_path}")
+    lines.sort(key=lambda item: item[0])
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('[\n' + ',\n'.join(line for _, line in lines) + '\n]\n')
+        print (f"Data saved to {output_path}!")
+    return len(lines)
+
+
 def serialize_response(response):
     """Serialize the response object to a JSON-serializable format"""
     def convert_to_serializable(obj, depth=0):
@@ -60,6 +162,20 @@ def serialize_response(response):
     return convert_to_serializable(response)
 
 
+async def run_bounded(items: List[Any], func: Callable[[Any], Awaitable[Any]], max_parallel: int, timeout_seconds: float) -> List[Any]:
+    """
+    Run func on all items concurrently, at most max_parallel at a time, each with its own timeout (None for none).
+    Returns the results in the order of items; a failed or timed out item gives its exception instead.
+    """
+    semaphore = asyncio.Semaphore(max_parallel)
+
+    async def run_one(item):
+        async with semaphore:
+            return await asyncio.wait_for(func(item), timeout=timeout_seconds)
+
+    return await asyncio.gather(*(run_one(item) for item in items), return_exceptions=True)
+
+
 def flatten(lst):
     """Flatten a nested list."""
     for item in lst:
@@ -179,3 +295,78 @@ def calculate_total_time(response_data: List[Dict[str, Any]]) -> float:
         if  isinstance(response['inner_messages'], list) and response['inner_messages']:
             total_time += response.get('task_time', 0)
     return total_time
+
+
+def calculate_phase_timings(response_data: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    Aggregate the per-phase timings of all responses.
+    Every occurrence of a phase (e.g. each LLM call or tool call) counts as one sample.
+    Returns {phase: {"count", "total", "p50", "p95", "p99"}} in seconds, for the phases that occurred.
+    """
+    samples: Dict[str, List[float]] = {}
+    for response in response_data:
+        for phase, durations in response.get('timings', {}).items():
+            samples.setdefault(phase, []).extend(durations)
+
+    phases = [p for p in PHASES if p in samples] + sorted(p for p in samples if p not in PHASES)
+    return {
+        phase: {
+            'count': len(samples[phase]),
+            'total': sum(samples[phase]),
+            'p50': percentile(samples[phase], 50),
+            'p95': percentile(samples[phase], 95),
+            'p99': percentile(samples[phase], 99),
+        }
+        for phase in phases
+    }
+
+
+def compare_runs(baseline_data: List[Dict[str, Any]], response_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compare the cost of a run with a baseline run of the same tasks, e.g. a scoring-only run with a normal run.
+    Only the tasks answered without error in both runs are compared.
+    Returns {"tasks", "baseline", "run", "savings"}: the total tokens, average task time, p95 task time
+    and number of model calls of each run, and the savings of the run in percent of the baseline.
+    """
+    answered = {r.get('task_id') for r in response_data if 'error' not in r}
+    common = {r.get('task_id') for r in baseline_data if 'error' not in r} & answered
+
+    def run_cost(responses):
+        responses = [r for r in responses if r.get('task_id') in common and 'error' not in r]
+        prompt_tokens, completion_tokens = calculate_total_tokens(responses)
+        task_times = [r.get('task_time', 0) for r in responses]
+        return {
+            'total_tokens': prompt_tokens + completion_tokens,
+            'average_time': sum(task_times) / len(task_times) if task_times else 0,
+            'p95_time': percentile(task_times, 95) if task_times else 0,
+            'llm_calls': sum(len(r.get('timings', {}).get(phase, [])) for r in responses for phase in ('llm_call', 'reflection')),
+        }
+
+    baseline, run = run_cost(baseline_data), run_cost(response_data)
+    return {
+        'tasks': len(common),
+        'baseline': baseline,
+        'run': run,
+        'savings': {
+            key: round(100 * (baseline[key] - run[key]) / baseline[key], 2) if baseline[key] else 0
+            for key in ('total_tokens', 'average_time', 'p95_time', 'llm_calls')
+        },
+    }
+
+
+def calculate_cache_stats(response_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregate the response cache counters of all responses.
+    Returns {"hits", "misses", "hit_rate", "saved_tokens", "saved_usd"}, or an empty dict if no call went through a cache.
+    """
+    hits = sum(r.get('llm_cache_hits', 0) for r in response_data)
+    misses = sum(r.get('llm_cache_misses', 0) for r in response_data)
+    if not hits and not misses:
+        return {}
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4),
+        'saved_tokens': sum(r.get('llm_cache_saved_tokens', 0) for r in response_data),
+        'saved_usd': round(sum(r.get('llm_cache_saved_usd', 0) for r in response_data), 6),
+    }
@@ -0,0 +1,57 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import pytest
+
+from src.agenttest import ServerStartError, construct_agent, load_server_tools
+from src.serverpool import ServerPool
+
+BROKEN = os.path.join("servers", "broken.py")
+DISTRACTOR = os.path.join("servers", "distractor.py")
+
+
+class BrokenPool(ServerPool):
+    """Server pool in which every server fails to start."""
+
+    @asynccontextmanager
+    async def _open_session(self, server_path):
+        raise RuntimeError("no such server")
+        yield
+
+
+def test_failed_servers_are_recorded():
+    async def run():
+        failed = {}
+        tools = await load_server_tools([BROKEN, DISTRACTOR], BrokenPool(), failed_servers=failed)
+        return tools, failed
+
+    tools, failed = asyncio.run(run())
+    assert tools == {}
+    assert failed == {BROKEN: "RuntimeError: no such server", DISTRACTOR: "RuntimeError: no such server"}
+
+
+def test_missing_expected_server_is_an_infrastructure_error():
+    async def run():
+        failed = {}
+        with pytest.raises(ServerStartError, match="broken.py"):
+            await construct_agent(None, [["broken"]], 2, 1, BrokenPool(), servers_list=[DISTRACTOR, BROKEN], failed_servers=failed)
+        return failed
+
+    assert set(asyncio.run(run())) == {BROKEN, DISTRACTOR}
+
+
+def test_expected_server_from_the_catalog_is_checked():
+    catalog = {
+        "broken": {"tools": [{"name": "broken_tool", "inputSchema": {"type": "object"}}]},
+        "distractor": {"tools": [{"name": "distractor_tool", "inputSchema": {"type": "object"}}]},
+    }
+
+    async def run():
+        failed = {}
+        with pytest.raises(ServerStartError):
+            await construct_agent(None, [["broken"]], 2, 1, BrokenPool(), catalog, [DISTRACTOR, BROKEN], failed_servers=failed)
+        return failed
+
+    # Servers of the catalog that the task does not need are not started
+    assert set(asyncio.run(run())) == {BROKEN}
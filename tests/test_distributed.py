@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+from src.distributed import Coordinator
+from src.utilities import JsonlWriter
+
+
+def make_tasks(count):
+    return [{"id": f"t{i}", "tools": [["tool"]]} for i in range(count)]
+
+
+def test_expired_lease_is_reassigned_and_late_result_accepted_once(tmp_path):
+    async def run():
+        coordinator = Coordinator(make_tasks(2), str(tmp_path / "out.json"), lease_timeout=0.05)
+        async with JsonlWriter(coordinator.jsonl_path) as writer:
+            coordinator._log_writer = writer
+            first = await coordinator._handle_message({"type": "lease", "worker": "a"})
+            assert first["task_index"] == 0
+
+            await asyncio.sleep(0.1)
+            # The lease of worker a expired, so its task goes to the front of the queue again
+            second = await coordinator._handle_message({"type": "lease", "worker": "b"})
+            assert second["task_index"] == 0
+            assert coordinator.reassigned == 1
+            renew = await coordinator._handle_message({"type": "renew", "lease_id": first["lease_id"]})
+            assert renew["type"] == "error"
+
+            response = {"task_id": "t0", "task_index": 1, "response": "late"}
+            late = await coordinator._handle_message({"type": "result", "lease_id": first["lease_id"], "response": response})
+            assert late == {"type": "ok"}
+            duplicate = {"task_id": "t0", "task_index": 1, "response": "again"}
+            await coordinator._handle_message({"type": "result", "lease_id": second["lease_id"], "response": duplicate})
+            assert coordinator.done == {"t0"}
+
+            third = await coordinator._handle_message({"type": "lease", "worker": "a"})
+            assert third["task_index"] == 1
+        with open(coordinator.jsonl_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    assert [record["response"] for record in asyncio.run(run())] == ["late"]
+
+
+def test_late_result_removes_requeued_task(tmp_path):
+    async def run():
+        coordinator = Coordinator(make_tasks(1), str(tmp_path / "out.json"), lease_timeout=0.05)
+        async with JsonlWriter(coordinator.jsonl_path) as writer:
+            coordinator._log_writer = writer
+            lease = await coordinator._handle_message({"type": "lease", "worker": "a"})
+            await asyncio.sleep(0.1)
+            coordinator._expire_leases()
+            assert list(coordinator.pending) == [0]
+            response = {"task_id": "t0", "task_index": 1}
+            await coordinator._handle_message({"type": "result", "lease_id": lease["lease_id"], "response": response})
+            assert not coordinator.pending
+            assert coordinator._finished.is_set()
+            done = await coordinator._handle_message({"type": "lease", "worker": "b"})
+            assert done == {"type": "done"}
+
+    asyncio.run(run())
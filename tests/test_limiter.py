@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+import pytest
+
+from src.limiter import AdaptiveConcurrencyLimiter, TokenBucket, is_throttle_error
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def feed(limiter, latency, count, busy=True):
+    """Complete count model calls of the given latency, with the limit fully used during the window if busy."""
+    async def run():
+        held = 0
+        while busy and limiter.in_flight < limiter.limit:
+            await limiter.acquire()
+            held += 1
+        started_at = time.monotonic()
+        for _ in range(count):
+            limiter.on_success(latency, started_at)
+        for _ in range(held):
+            limiter.release()
+
+    asyncio.run(run())
+
+
+def test_limit_grows_by_one_per_window_within_tolerance():
+    limiter = AdaptiveConcurrencyLimiter(2, max_limit=4, min_window=5)
+    feed(limiter, 1.0, 5)
+    assert limiter.limit == 3
+    feed(limiter, 1.0, 5)
+    assert limiter.limit == 4
+    # Capped at max_limit
+    feed(limiter, 1.0, 5)
+    assert limiter.limit == 4
+    assert [d["action"] for d in limiter.decisions] == ["increase", "increase"]
+
+
+def test_limit_does_not_grow_while_unused():
+    limiter = AdaptiveConcurrencyLimiter(4, min_window=5)
+    feed(limiter, 1.0, 5, busy=False)
+    feed(limiter, 1.0, 5, busy=False)
+    assert limiter.limit == 4
+    assert limiter.decisions == []
+    # Load reaching the limit lets it grow again
+    feed(limiter, 1.0, 5)
+    assert limiter.limit == 5
+
+
+def test_limit_backs_off_when_latency_rises():
+    limiter = AdaptiveConcurrencyLimiter(8, min_window=5)
+    feed(limiter, 1.0, 8)
+    assert limiter.limit == 9
+    feed(limiter, 2.0, 9)
+    assert limiter.limit == 4
+    assert limiter.decisions[-1]["action"] == "decrease"
+
+
+def test_limit_backs_off_on_throttle_and_ignores_older_calls():
+    limiter = AdaptiveConcurrencyLimiter(8, min_limit=2)
+    started_at = time.monotonic()
+    limiter.on_throttle(StatusError(429), started_at)
+    assert limiter.limit == 4
+    # A call sent before the decrease was sent under the old limit and is not counted again
+    limiter.on_throttle(StatusError(429), started_at)
+    assert limiter.limit == 4
+    limiter.on_throttle(StatusError(503), time.monotonic())
+    limiter.on_throttle(StatusError(503), time.monotonic())
+    assert limiter.limit == 2
+
+
+def test_throttle_errors():
+    assert is_throttle_error(StatusError(429))
+    assert is_throttle_error(StatusError(502))
+    assert not is_throttle_error(StatusError(400))
+    assert not is_throttle_error(ValueError("no status"))
+
+
+def test_limiter_admits_at_most_limit_in_arrival_order():
+    async def run():
+        limiter = AdaptiveConcurrencyLimiter(2)
+        order = []
+
+        async def worker(name):
+            async with limiter:
+                order.append(name)
+                assert limiter.in_flight <= 2
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(worker(i) for i in range(6)))
+        return limiter, order
+
+    limiter, order = asyncio.run(run())
+    assert order == list(range(6))
+    assert limiter.peak_in_flight == 2
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def run():
+        limiter = AdaptiveConcurrencyLimiter(1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        await asyncio.wait_for(limiter.acquire(), 1)
+        return limiter
+
+    assert asyncio.run(run()).in_flight == 1
+
+
+def test_waiter_cancelled_while_a_slot_is_released():
+    async def run():
+        limiter = AdaptiveConcurrencyLimiter(1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        limiter.release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return limiter
+
+    assert asyncio.run(run()).in_flight == 0
+
+
+def test_token_bucket_allows_a_burst_then_refills_at_rate():
+    async def run():
+        bucket = TokenBucket(600)  # 10 tokens per second
+        burst_wait = await bucket.acquire(600)
+        refill_wait = await bucket.acquire(2)
+        return burst_wait, refill_wait
+
+    burst_wait, refill_wait = asyncio.run(run())
+    assert burst_wait < 0.05
+    assert 0.15 < refill_wait < 0.5
+
+
+def test_token_bucket_adjust_corrects_an_estimate():
+    async def run():
+        bucket = TokenBucket(60)
+        await bucket.acquire(10)
+        bucket.adjust(-5)
+        return bucket.tokens
+
+    assert asyncio.run(run()) == pytest.approx(55, abs=0.5)
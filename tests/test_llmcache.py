@@ -0,0 +1,63 @@
+from autogen_core.models import SystemMessage, UserMessage
+from autogen_core.tools import FunctionTool
+
+from src.llmcache import ResponseCache, request_key
+
+
+def get_weather(city: str) -> str:
+    """Get the weather of a city."""
+    return city
+
+
+MESSAGES = [SystemMessage(content="You are helpful."), UserMessage(content="Weather in Paris?", source="user")]
+TOOLS = [FunctionTool(get_weather, description="Get the weather of a city.")]
+
+
+def key(**changes):
+    args = dict(model="m", messages=MESSAGES, tools=TOOLS, tool_choice="auto", json_output=None,
+                extra_create_args={}, sampling_params={"temperature": 0})
+    args.update(changes)
+    return request_key(**args)
+
+
+def test_request_key_is_stable():
+    assert key() == key()
+    # Equal content in new objects gives the same key
+    assert key(messages=[m.model_copy() for m in MESSAGES], sampling_params={"temperature": 0}) == key()
+
+
+def test_request_key_covers_every_input():
+    base = key()
+    assert key(model="other") != base
+    assert key(messages=MESSAGES[:1]) != base
+    assert key(tools=[]) != base
+    assert key(tool_choice="none") != base
+    assert key(json_output=True) != base
+    assert key(extra_create_args={"max_tokens": 10}) != base
+    assert key(sampling_params={"temperature": 0.7}) != base
+
+
+def test_response_cache_round_trip(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    assert cache.get("k") is None
+    cache.put("k", "value")
+    assert cache.get("k") == "value"
+    cache.close()
+    # The responses are kept on disk across runs
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    assert cache.get("k") == "value"
+    assert cache.stats()["entries"] == 1
+    cache.close()
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=2500)
+    cache.put("a", "x" * 1000)
+    cache.put("b", "x" * 1000)
+    assert cache.get("a") is not None
+    cache.put("c", "x" * 1000)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    cache.close()
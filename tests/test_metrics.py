@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from src.metrics import percentile, record_timing, start_task_metrics, timed
+from src.utilities import calculate_phase_timings
+
+
+def test_percentile_interpolates_between_ranks():
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 100) == 5.0
+    assert percentile(values, 95) == pytest.approx(4.8)
+    assert percentile([2.0, 4.0], 50) == 3.0
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) == 0.0
+
+
+def test_timed_records_into_the_metrics_of_the_current_task():
+    async def task(name):
+        metrics = start_task_metrics()
+        with timed("tool_call"):
+            await asyncio.sleep(0.01)
+        # Tasks started by a task share its metrics
+        await asyncio.create_task(child())
+        with pytest.raises(ValueError):
+            with timed("llm_call"):
+                raise ValueError(name)
+        return metrics
+
+    async def child():
+        record_timing("spawn", 0.5)
+
+    async def run():
+        return await asyncio.gather(task("a"), task("b"))
+
+    for metrics in asyncio.run(run()):
+        timings = metrics["timings"]
+        assert len(timings["tool_call"]) == 1 and timings["tool_call"][0] >= 0.01
+        assert timings["spawn"] == [0.5]
+        # A failed block is timed too
+        assert len(timings["llm_call"]) == 1
+
+
+def test_calculate_phase_timings():
+    responses = [
+        {"timings": {"llm_call": [1.0, 3.0], "tool_call": [0.5], "custom": [2.0]}},
+        {"timings": {"llm_call": [2.0], "spawn": [4.0]}},
+        {"error": "timeout"},
+    ]
+    phase_timings = calculate_phase_timings(responses)
+    # Known phases in their report order, then the others by name
+    assert list(phase_timings) == ["spawn", "llm_call", "tool_call", "custom"]
+    assert phase_timings["llm_call"] == {"count": 3, "total": 6.0, "p50": 2.0, "p95": pytest.approx(2.9), "p99": pytest.approx(2.98)}
+    assert phase_timings["spawn"]["count"] == 1
+    assert calculate_phase_timings([]) == {}
@@ -0,0 +1,17 @@
+import asyncio
+import json
+
+from autogen_core.models import UserMessage
+
+from src.config import ModelRegistry
+
+
+def test_oracle_answers_the_tasks_of_the_run(tmp_path):
+    task = {"id": "t1", "content": "Convert 3 miles to km.", "tools": [["unit_converter"]], "inputs": [[{"value": 3}]]}
+    registry = ModelRegistry(str(tmp_path / "missing.json"))
+    client = registry.get("oracle", tasks=[task])["client"]
+    client.latency = 0
+
+    result = asyncio.run(client.create([UserMessage(content=task["content"], source="user")]))
+    assert [(call.name, json.loads(call.arguments)) for call in result.content] == [("unit_converter", {"value": 3})]
+    asyncio.run(registry.close())
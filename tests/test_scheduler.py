@@ -0,0 +1,51 @@
+import json
+
+from src.scheduler import estimate_makespan, estimate_task_costs, load_task_history, schedule_tasks
+
+
+def make_task(task_id, tools):
+    return {"id": task_id, "tools": tools}
+
+
+def test_load_task_history_takes_the_median_of_successful_runs(tmp_path):
+    runs = [
+        [{"task_id": "a", "task_time": 1.0}, {"task_id": "b", "task_time": 5.0}],
+        [{"task_id": "a", "task_time": 3.0}, {"task_id": "b", "error": "timeout", "task_time": 60.0}],
+        [{"task_id": "a", "task_time": 10.0}],
+    ]
+    for i, responses in enumerate(runs):
+        (tmp_path / f"m_response_{i}.json").write_text(json.dumps(responses))
+    (tmp_path / "other_response_0.json").write_text(json.dumps([{"task_id": "a", "task_time": 100.0}]))
+
+    assert load_task_history(str(tmp_path), model="m") == {"a": 3.0, "b": 5.0}
+    # A model without logs of its own falls back to all logs
+    assert load_task_history(str(tmp_path), model="new")["a"] == 6.5
+    assert load_task_history(str(tmp_path / "missing")) == {}
+
+
+def test_estimate_task_costs_fallbacks():
+    tasks = [
+        make_task("known", [["t1"], ["t2"]]),
+        make_task("same_shape", [["t3"], ["t4"]]),
+        make_task("other_shape", [["t1", "t2", "t3"]]),
+    ]
+    history = {"known": 8.0}
+    # Own time, then the time of tasks with the same shape, then the time per tool call
+    assert estimate_task_costs(tasks, history) == [8.0, 8.0, 12.0]
+    # Without history the cost is the number of tool calls plus steps
+    assert estimate_task_costs(tasks, {}) == [4.0, 4.0, 4.0]
+
+
+def test_schedule_tasks_longest_first_with_ties_in_file_order():
+    tasks = [make_task(str(i), [["t"]]) for i in range(5)]
+    assert schedule_tasks(tasks, [1.0, 5.0, 2.0, 5.0, 1.0]) == [1, 3, 2, 0, 4]
+
+
+def test_longest_first_shortens_the_makespan():
+    costs = [1.0, 1.0, 1.0, 1.0, 4.0]
+    tasks = [make_task(str(i), [["t"]]) for i in range(len(costs))]
+    order = schedule_tasks(tasks, costs)
+    assert estimate_makespan(costs, 2) == 6.0
+    assert estimate_makespan([costs[i] for i in order], 2) == 4.0
+    assert estimate_makespan(costs, 10) == 4.0
+    assert estimate_makespan([], 4) == 0.0
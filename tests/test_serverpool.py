@@ -0,0 +1,98 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from src.serverpool import ProcessBudget, ServerPool
+
+
+class FakeSession:
+    async def initialize(self):
+        await asyncio.sleep(0.01)
+
+
+class FakePool(ServerPool):
+    """Server pool whose servers are fake sessions instead of processes."""
+
+    @asynccontextmanager
+    async def _open_session(self, server_path):
+        yield FakeSession()
+
+
+async def call(pool, server_path, hold):
+    async with pool.use(server_path):
+        await asyncio.sleep(hold)
+
+
+def test_abandoned_spawns_do_not_hold_process_slots():
+    async def run():
+        budget = ProcessBudget(2)
+        pool = FakePool(budget=budget)
+        busy = [asyncio.create_task(call(pool, f"busy{i}", 0.3)) for i in range(2)]
+        await asyncio.sleep(0.05)
+        # Callers that give up while waiting for a slot must not leave servers behind that take slots later
+        for i in range(10):
+            try:
+                await asyncio.wait_for(call(pool, f"abandoned{i}", 0.01), 0.02)
+            except asyncio.TimeoutError:
+                pass
+        await asyncio.gather(*busy)
+        await asyncio.wait_for(asyncio.gather(*(call(pool, f"new{i}", 0.01) for i in range(5))), 5)
+        assert budget.waiting == 0
+        assert budget.live <= 2
+        await pool.close()
+        return budget
+
+    budget = asyncio.run(run())
+    assert budget.live == 0
+    assert budget.peak_live <= 2
+
+
+def test_server_is_not_evicted_between_start_and_use():
+    async def run():
+        pool = FakePool()
+        evicted = []
+        user = asyncio.create_task(call(pool, "server", 0))
+        await asyncio.sleep(0)
+        # Eviction right after the server becomes ready, before the waiting caller resumes
+        pool._servers["server"]["ready"].add_done_callback(lambda _: evicted.append(pool.evict_idle()))
+        await user
+        await pool.close()
+        return evicted
+
+    assert asyncio.run(run()) == [False]
+
+
+class SlowPool(FakePool):
+    """Server pool whose servers take longer to start than the start timeout."""
+
+    @asynccontextmanager
+    async def _open_session(self, server_path):
+        await asyncio.sleep(1)
+        yield FakeSession()
+
+
+def test_start_timeout_does_not_count_the_wait_for_a_process_slot():
+    async def run():
+        budget = ProcessBudget(1)
+        pool = FakePool(budget=budget, start_timeout_seconds=0.1)
+        busy = asyncio.create_task(call(pool, "busy", 0.3))
+        await asyncio.sleep(0.05)
+        # Waits about 0.25 s for the slot, longer than the start timeout, but starts in time once it has it
+        await call(pool, "waiting", 0)
+        await busy
+        await pool.close()
+
+    asyncio.run(run())
+
+
+def test_server_that_starts_too_slowly_times_out():
+    async def run():
+        budget = ProcessBudget(1)
+        pool = SlowPool(budget=budget, start_timeout_seconds=0.1)
+        with pytest.raises(TimeoutError):
+            await call(pool, "slow", 0)
+        await pool.close()
+        return budget
+
+    assert asyncio.run(run()).live == 0
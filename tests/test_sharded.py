@@ -0,0 +1,62 @@
+import json
+
+from src.config import ModelRegistry
+from src.sharded import merge_shard_decisions, merge_shard_logs, shard_of
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return str(path)
+
+
+def test_shard_of_depends_only_on_the_task_id():
+    ids = [f"task_{i}" for i in range(100)]
+    shards = [shard_of(task_id, 4) for task_id in ids]
+    assert shards == [shard_of(task_id, 4) for task_id in ids]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_merge_shard_logs(tmp_path):
+    tasks = [{"id": f"t{i}"} for i in range(4)]
+    shard_logs = [
+        write_jsonl(tmp_path / "shard0.jsonl", [
+            {"task_index": 1, "task_id": "t3", "response": "a"},
+            {"task_index": 2, "task_id": "t1", "response": "b"},
+        ]),
+        write_jsonl(tmp_path / "shard1.jsonl", [
+            {"task_index": 1, "task_id": "t0", "response": "c"},
+            # A task answered twice (e.g. by a resumed shard) is kept once
+            {"task_index": 2, "task_id": "t1", "response": "duplicate"},
+            {"task_index": 3, "task_id": "unknown", "response": "d"},
+        ]),
+    ]
+    output_path = str(tmp_path / "merged.json")
+
+    assert merge_shard_logs(tasks, shard_logs, output_path) == 3
+    with open(output_path, encoding="utf-8") as f:
+        merged = json.load(f)
+    assert [(r["task_index"], r["task_id"], r["response"]) for r in merged] == [
+        (1, "t0", "c"), (2, "t1", "b"), (4, "t3", "a")
+    ]
+
+
+def test_merge_shard_decisions(tmp_path):
+    (tmp_path / "shard0_concurrency.json").write_text(json.dumps({"final_limit": 3}))
+    shard_paths = [str(tmp_path / "shard0.json"), str(tmp_path / "shard1.json")]
+    output_path = str(tmp_path / "merged.json")
+
+    assert merge_shard_decisions(shard_paths, output_path) == str(tmp_path / "merged_concurrency.json")
+    with open(tmp_path / "merged_concurrency.json", encoding="utf-8") as f:
+        assert json.load(f) == {"shards": [{"final_limit": 3, "shard": 0}]}
+    assert merge_shard_decisions(shard_paths[1:], output_path) is None
+
+
+def test_quota_share_splits_the_rate_limits(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps([
+        {"name": "limited", "model": "oracle", "requests_per_minute": 60, "tokens_per_minute": 1000},
+    ]))
+    registry = ModelRegistry(str(config_path), quota_share=0.25)
+    client = registry.get("limited")["client"]
+    assert client.request_bucket.capacity == 15
+    assert client.token_bucket.capacity == 250